@@ -1,5 +1,15 @@
+from pydantic import Field
+
 from holo.config.base import HoloSettings
 
 
 class SegmentConfig(HoloSettings):
     SEGMENT_WRITE_KEY: str = ""
+    # Base URL of the Segment HTTP API, point it to a local stand-in to test uploads.
+    SEGMENT_HOST: str = "https://api.segment.io"
+    # Maximum number of events waiting to be uploaded, more events are dropped.
+    SEGMENT_QUEUE_SIZE: int = Field(default=10000, ge=1)
+    # Maximum number of events per upload.
+    SEGMENT_BATCH_SIZE: int = Field(default=100, ge=1)
+    # Seconds to wait for more events before uploading a batch that isn't full.
+    SEGMENT_FLUSH_INTERVAL: float = 0.5
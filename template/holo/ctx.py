@@ -6,27 +6,51 @@ Inspired by: https://github.com/tomwojcik/starlette-context
 
 """
 
+import asyncio
 import logging
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
 from contextvars import ContextVar
+from hashlib import sha256
 from http import HTTPStatus
+from time import perf_counter, time
 from typing import Any
 
-import aiohttp
 import jwt
-from aiocache import cached
 from jwt.exceptions import DecodeError
+from prometheus_client import Counter, Histogram
 from starlette.datastructures import Headers
 from starlette.responses import PlainTextResponse
-from tenacity import RetryError, retry, stop_after_attempt, wait_exponential
 
 from holo.config import config
 from holo.core.entities import RequestPerformer
+from holo.jwks import jwks
 
 
 # Automatically scoped context.
 _holo_service_context: ContextVar[dict[Any, Any]] = ContextVar("holo_service_context")
 logger = logging.getLogger(__name__)
 
+# Seconds a token is accepted after expiring, cached claims are dropped this
+# many seconds before the token expires.
+JWT_LEEWAY = 10
+
+JWT_CACHE_HITS = Counter("jwt_cache_hits_total", "Total count of tokens found in the verified JWT claims cache")
+JWT_CACHE_MISSES = Counter(
+    "jwt_cache_misses_total",
+    "Total count of tokens not found in the verified JWT claims cache",
+)
+JWT_VERIFICATION_TIME = Histogram(
+    "jwt_verification_time_seconds",
+    "Histogram of JWT signature verification time (in seconds)",
+)
+
+MALFORMED_AUTH_HEADER_RESPONSE = PlainTextResponse(
+    "malformed Authorization header, use: Bearer ENCODED_JWT_TOKEN",
+    status_code=HTTPStatus.BAD_REQUEST.value,
+)
+
 
 class _Context:
     """
@@ -40,8 +64,31 @@ class _Context:
         except LookupError:
             raise
 
+    def memoize[T](self, key: str, factory: Callable[[], T]) -> T:
+        """
+        Get the value of `key` for the current request, built by `factory` on
+        first access. Use it for values derived from the context that are
+        used several times per request, or not at all.
+        """
+        memo = self.raw.setdefault("memo", {})
+        try:
+            return memo[key]
+        except KeyError:
+            value = memo[key] = factory()
+            return value
+
     @property
     def request_performer(self) -> RequestPerformer | None:
+        return self.memoize("request_performer", self._build_request_performer)
+
+    @property
+    def segment_user_id(self) -> str | None:
+        """
+        Hash of the JWT subject, to identify the user in Segment.
+        """
+        return self.memoize("segment_user_id", self._build_segment_user_id)
+
+    def _build_request_performer(self) -> RequestPerformer | None:
         if jwt_dict := self.raw.get("jwt_dict"):
             return RequestPerformer(
                 id=jwt_dict["sub"],
@@ -58,6 +105,11 @@ class _Context:
             )
         return None
 
+    def _build_segment_user_id(self) -> str | None:
+        if subject := (self.raw.get("jwt_dict") or {}).get("sub"):
+            return sha256(subject.encode()).hexdigest()
+        return None
+
     @property
     def auth_header(self) -> str:
         return self.raw.get("auth_header") or ""
@@ -66,85 +118,108 @@ class _Context:
 context = _Context()
 
 
+@contextmanager
+def request_context(ctx: dict) -> Iterator[None]:
+    """
+    Use `ctx` as `context.raw` within the block.
+    """
+    token = _holo_service_context.set(ctx)
+    try:
+        yield
+    finally:
+        _holo_service_context.reset(token)
+
+
+def get_bearer_token(auth_header: str | None) -> str:
+    """
+    Return the encoded token of a bearer Authorization header, or an empty
+    string without header.
+
+    Raises:
+        DecodeError: When the header isn't a bearer token.
+    """
+    if not auth_header:
+        return ""
+
+    try:
+        scheme, encoded_token = auth_header.split()
+    except ValueError:
+        raise DecodeError
+
+    if scheme.lower() != "bearer":
+        raise DecodeError
+
+    return encoded_token
+
+
 class ASGIContextMiddleware:
     def __init__(self, app):
         self.app = app
 
-    @property
-    @cached(ttl=300)
-    async def jwk_set(self) -> jwt.PyJWKSet | None:
-        try:
-            jwks = await self.__get_jwk_set()
-            return jwks
-        except RetryError:
-            return None
-
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=2, min=1, max=10))
-    async def __get_jwk_set(self) -> jwt.PyJWKSet | None:
-        """
-        Get public key certificates (jwks) from auth service who signed the encoded JWT.
-        """
-        if config.service.AUTH_BASE_URL:
-            jwks_url = f"{config.service.AUTH_BASE_URL}/jwks"
-            try:
-                async with aiohttp.request("GET", jwks_url) as response:
-                    response.raise_for_status()
-                    certificates = await response.json()
-                    jwks = jwt.PyJWKSet.from_dict(certificates)
-            except Exception:
-                logger.exception("Failed to get jwks from %s", jwks_url)
-                raise
-            else:
-                return jwks
-
-    @cached()
-    async def __get_jwk(self, kid: str) -> jwt.PyJWK:
-        """
-        Return the jwk for the requested kid.
-        """
-        jwk_set = await self.jwk_set
-        try:
-            jwk = jwk_set[kid]
-        except KeyError:
-            logger.error("There is no jwk available for token with kid: %s", kid)
-            raise DecodeError
-        else:
-            return jwk
+        # Verified claims by token hash, with the time they're valid until.
+        self._claims: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
 
     @staticmethod
     def __get_token_from_header(scope) -> str:
         headers = Headers(scope=scope)
-        auth_header = headers.get("authorization", None)
-
-        if not auth_header:
-            return ""
-
-        try:
-            scheme, encoded_token = auth_header.split()
-        except ValueError:
-            raise DecodeError
-
-        if scheme.lower() != "bearer":
-            raise DecodeError
-
-        return encoded_token
+        return get_bearer_token(headers.get("authorization", None))
 
     async def decode_token(self, encoded_token: str) -> Any:
         """
         Decode encoded JWT token.
         """
-        if await self.jwk_set:
+        if jwks.enabled:
+            token_hash = sha256(encoded_token.encode()).digest()
+            if (claims := self.__get_cached_claims(token_hash)) is not None:
+                return claims
+
             try:
                 kid = jwt.get_unverified_header(encoded_token).get("kid")
-                jwk = await self.__get_jwk(kid)
-
-                return jwt.decode(encoded_token, jwk, leeway=10)
+                jwk = await jwks.get_jwk(kid)
+
+                before_time = perf_counter()
+                if jwk.algorithm_name.startswith("HS"):
+                    claims = jwt.decode(encoded_token, jwk, leeway=JWT_LEEWAY)
+                else:
+                    # Verifying asymmetric signatures is expensive, don't block the event loop.
+                    claims = await asyncio.to_thread(jwt.decode, encoded_token, jwk, leeway=JWT_LEEWAY)
+                JWT_VERIFICATION_TIME.observe(perf_counter() - before_time)
+            except KeyError:
+                logger.error("There is no jwk available for token with kid: %s", kid)
+                raise DecodeError
             except Exception as e:
                 logger.exception(e)
                 raise DecodeError
+
+            self.__cache_claims(token_hash, claims)
+            return dict(claims)
         else:
-            # No jwks available so we skip signature verification.
-            return jwt.decode(encoded_token, options={"verify_signature": False}, leeway=10)
+            # No auth service configured so we skip signature verification.
+            return jwt.decode(encoded_token, options={"verify_signature": False}, leeway=JWT_LEEWAY)
+
+    def __get_cached_claims(self, token_hash: bytes) -> dict | None:
+        entry = self._claims.get(token_hash)
+        if entry is None or entry[0] <= time():
+            if entry is not None:
+                del self._claims[token_hash]
+            JWT_CACHE_MISSES.inc()
+            return None
+
+        self._claims.move_to_end(token_hash)
+        JWT_CACHE_HITS.inc()
+        return dict(entry[1])
+
+    def __cache_claims(self, token_hash: bytes, claims: dict) -> None:
+        """
+        Cache the verified claims until the token expires, minus the leeway.
+        Tokens without expiry are not cached.
+        """
+        if not isinstance(exp := claims.get("exp"), int | float) or exp - JWT_LEEWAY <= time():
+            return
+
+        self._claims[token_hash] = (exp - JWT_LEEWAY, claims)
+        while len(self._claims) > config.service.JWT_CACHE_SIZE:
+            self._claims.popitem(last=False)
 
     async def __call__(self, scope, receive, send) -> None:
         if scope["type"] not in ("http", "websocket"):
@@ -157,14 +232,7 @@ class ASGIContextMiddleware:
                 ctx["auth_header"] = f"Bearer {encoded_token}"
                 ctx["jwt_dict"] = await self.decode_token(encoded_token)  # Raises DecodeError.
         except DecodeError:
-            response = PlainTextResponse(
-                "malformed Authorization header, use: Bearer ENCODED_JWT_TOKEN",
-                status_code=HTTPStatus.BAD_REQUEST.value,
-            )
-            await response(scope, receive, send)
+            await MALFORMED_AUTH_HEADER_RESPONSE(scope, receive, send)
         else:
-            token = _holo_service_context.set(ctx)
-            try:
+            with request_context(ctx):
                 await self.app(scope, receive, send)
-            finally:
-                _holo_service_context.reset(token)
@@ -1,9 +1,16 @@
+from time import time
+
 import httpx
+import jwt
 import pytest
 from fastapi import FastAPI
+from freezegun import freeze_time
+from jwt.exceptions import DecodeError
 
+from holo.config import config
 from holo.core.entities import RequestPerformer
-from holo.ctx import ASGIContextMiddleware, context
+from holo.ctx import JWT_LEEWAY, ASGIContextMiddleware, context
+from holo.jwks import jwks
 
 
 # DECODED_MACHINE_KEY_JWT:
@@ -34,6 +41,22 @@ ENCODED_MACHINE_KEY_JWT = "eyJhbGciOiJFUzI1NiIsImtpZCI6IjFjOGJlNDYiLCJ0eXAiOiJKV
 # }
 ENCODED_USER_JWT = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJ0eXBlIjoidXNlciIsInN1YiI6ImM2ZmEwNDEwLTFiYTItNGFiMC1hNDYwLTIzNjlhMjQ4ODgzYiIsIm9yaWdpbmFsX3Rva2VuIjoicTE4SkxPSkZCX1E3OFVPWHZZVVJvazE4ZS1kcTJaVi1ISjQwRHY2Q0hwYyIsImNsaWVudF9pZCI6ImM5MmNkYTQ4LWZjYmQtNDZhZi1iZDI3LWQ0MGUyYjZlNWQ5OSIsInBhcnRuZXJfaWQiOm51bGwsInBvcnRhbF9wYXJ0bmVyX2lkIjoiNWNmZTI5YjUtZDQ5ZS00MzIwLTkxZTItMGRlZDU0Mzg0YzY1IiwicG9ydGFsX3VybCI6Imh0dHBzOi8vcGFydG5lci52b2lwZ3JpZC5ubCIsIndpa2lfdXJsIjoiaHR0cHM6Ly93aWtpLnZvaXBncmlkLm5sL2luZGV4LnBocC8iLCJmaXJzdF9uYW1lIjoiSm9obiIsInByZXBvc2l0aW9uIjoiIiwibGFzdF9uYW1lIjoiRG9lIn0.HkJLKHn-wgEN4VUPb7nHxolJ4bvyHqEWOCMvLmQSZ9Y"  # noqa
 
+JWT_SECRET = "some-secret-that-is-long-enough"
+JWK = jwt.PyJWK({"kty": "oct", "kid": "key-1", "alg": "HS256", "k": "c29tZS1zZWNyZXQtdGhhdC1pcy1sb25nLWVub3VnaA"})
+
+
+def encode_jwt(sub: str, exp: float) -> str:
+    return jwt.encode({"sub": sub, "exp": exp}, JWT_SECRET, algorithm="HS256", headers={"kid": "key-1"})
+
+
+@pytest.fixture
+def get_jwk(mocker):
+    """
+    Enables the jwks, returning JWK for every token.
+    """
+    mocker.patch.object(config.service, "AUTH_BASE_URL", "http://auth.test")
+    return mocker.patch.object(jwks, "get_jwk", return_value=JWK)
+
 
 @pytest.fixture
 def fastapi_app() -> FastAPI:
@@ -136,3 +159,68 @@ async def test_middleware_malformed_jwt(async_client) -> None:
 
     assert response.status_code == 400
     assert response.text == "malformed Authorization header, use: Bearer ENCODED_JWT_TOKEN"
+
+
+async def test_request_performer_memoized(fastapi_app, async_client) -> None:
+    """
+    Test the request performer is built once per request.
+    """
+
+    @fastapi_app.get("/auth-info")
+    async def auth_info() -> dict:
+        return {"same": context.request_performer is context.request_performer}
+
+    async with async_client:
+        response = await async_client.get("/auth-info", headers={"Authorization": f"Bearer {ENCODED_USER_JWT}"})
+
+    assert response.json() == {"same": True}
+
+
+async def test_jwt_cache_reuse(get_jwk) -> None:
+    """
+    Test the verified claims of a token are reused, as a copy.
+    """
+    middleware = ASGIContextMiddleware(None)
+    token = encode_jwt("user-1", time() + 60)
+
+    claims = await middleware.decode_token(token)
+    claims["sub"] = "changed"
+
+    assert (await middleware.decode_token(token))["sub"] == "user-1"
+    assert get_jwk.call_count == 1
+
+
+async def test_jwt_cache_expired(get_jwk) -> None:
+    """
+    Test an expired token is rejected, even though its claims are still cached.
+    """
+    middleware = ASGIContextMiddleware(None)
+
+    with freeze_time() as frozen_time:
+        token = encode_jwt("user-1", time() + 60)
+        await middleware.decode_token(token)
+
+        frozen_time.tick(60 + JWT_LEEWAY)
+        with pytest.raises(DecodeError):
+            await middleware.decode_token(token)
+
+    assert get_jwk.call_count == 2
+
+
+async def test_jwt_cache_eviction(get_jwk, mocker) -> None:
+    """
+    Test the least recently used claims are evicted at JWT_CACHE_SIZE tokens.
+    """
+    mocker.patch.object(config.service, "JWT_CACHE_SIZE", 2)
+    middleware = ASGIContextMiddleware(None)
+    tokens = [encode_jwt(f"user-{i}", time() + 60) for i in range(3)]
+
+    for token in tokens:
+        await middleware.decode_token(token)
+    assert get_jwk.call_count == 3
+
+    # The first token was evicted, the last one is still cached.
+    await middleware.decode_token(tokens[0])
+    assert get_jwk.call_count == 4
+    await middleware.decode_token(tokens[2])
+    assert get_jwk.call_count == 4
@@ -2,8 +2,9 @@ from typing import Any, TypeVar
 
 from polyfactory import AsyncPersistenceProtocol
 from polyfactory.factories.sqlalchemy_factory import SQLAlchemyFactory
-from sqlalchemy import inspect
+from sqlalchemy import inspect, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 
 T = TypeVar("T")
@@ -35,12 +36,23 @@ class AsyncPersistenceHandler(AsyncPersistenceProtocol[T]):
         self.__session.add_all(data)
         await self.__session.flush()
 
-        for instance in data:
-            relationships = []
-            for relationship in inspect(instance.__class__).relationships:
-                relationships.append(relationship.key)
-
-            await self.__session.refresh(instance, relationships)
+        # Refresh the instances of a model with one query instead of one per instance.
+        for model in {instance.__class__ for instance in data}:
+            mapper = inspect(model)
+            instances = [instance for instance in data if instance.__class__ is model]
+            if len(mapper.primary_key) != 1:
+                for instance in instances:
+                    await self.__session.refresh(instance, [relationship.key for relationship in mapper.relationships])
+                continue
+
+            primary_key = mapper.primary_key[0]
+            ids = [mapper.primary_key_from_instance(instance)[0] for instance in instances]
+            await self.__session.scalars(
+                select(model)
+                .where(primary_key.in_(ids))
+                .options(*(selectinload(relationship.class_attribute) for relationship in mapper.relationships))
+                .execution_options(populate_existing=True),
+            )
         return data
 
 
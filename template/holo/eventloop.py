@@ -0,0 +1,153 @@
+"""
+Instrumentation of the event loop, to tell whether latency is caused by
+callbacks blocking the loop and where they block it.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import traceback
+from contextlib import suppress
+from time import perf_counter
+from types import FrameType
+from typing import Any
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from holo.config import config
+
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Histogram of the delay of the event loop in running a scheduled callback (in seconds)",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+EVENT_LOOP_TASKS = Gauge("event_loop_tasks", "Gauge of asyncio tasks that are not done")
+EVENT_LOOP_BLOCKED = Counter(
+    "event_loop_blocked_total",
+    "Total count of callbacks blocking the event loop longer than LOOP_SLOW_CALLBACK_DURATION by location",
+    ["location"],
+)
+
+# Frames in these paths are skipped to find the location of a blocking callback.
+_LIBRARY_PATHS = tuple({sysconfig.get_path("stdlib"), sysconfig.get_path("purelib"), sysconfig.get_path("platlib")})
+
+
+class LoopMonitor:
+    """
+    Measures how late the event loop wakes up a task sleeping for
+    LOOP_MONITOR_INTERVAL seconds, and counts the running tasks.
+
+    A watchdog thread samples the stack of the event loop thread when the
+    loop is blocked for more than LOOP_SLOW_CALLBACK_DURATION seconds, and
+    reports the innermost frame of the service as the location.
+    """
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: int | None = None
+        # When the loop should wake up the monitor task next.
+        self._deadline = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return config.service.LOOP_MONITOR_INTERVAL > 0
+
+    async def start(self) -> None:
+        if not self.enabled or self._task:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._deadline = perf_counter() + config.service.LOOP_MONITOR_INTERVAL
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        if self._watchdog:
+            self._stopped.set()
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        interval = config.service.LOOP_MONITOR_INTERVAL
+        while True:
+            self._deadline = perf_counter() + interval
+            await asyncio.sleep(interval)
+            EVENT_LOOP_LAG.observe(max(perf_counter() - self._deadline, 0))
+            EVENT_LOOP_TASKS.set(len(asyncio.all_tasks()))
+
+    def _watch(self) -> None:
+        threshold = config.service.LOOP_SLOW_CALLBACK_DURATION
+        reported_deadline = None
+        while not self._stopped.wait(threshold / 2):
+            deadline = self._deadline
+            blocked = perf_counter() - deadline
+            if blocked < threshold or deadline == reported_deadline:
+                continue
+
+            # Report each blocking callback once.
+            reported_deadline = deadline
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            location = _location(frame)
+            EVENT_LOOP_BLOCKED.labels(location=location).inc()
+            logger.warning(
+                "Event loop blocked for at least %.3fs at %s:\n%s",
+                blocked,
+                location,
+                "".join(traceback.format_stack(frame)),
+            )
+
+
+def _location(frame: FrameType) -> str:
+    """
+    The innermost frame outside the standard library and dependencies, or
+    the innermost frame when there is none.
+    """
+    innermost = frame
+    while frame is not None:
+        if not frame.f_code.co_filename.startswith(_LIBRARY_PATHS):
+            break
+        frame = frame.f_back
+    frame = frame or innermost
+    return f"{os.path.relpath(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+def dump_tasks() -> list[dict[str, Any]]:
+    """
+    The asyncio tasks that are not done, with the stack they're suspended at.
+    """
+    tasks = []
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        tasks.append(
+            {
+                "name": task.get_name(),
+                "coro": getattr(coro, "__qualname__", repr(coro)),
+                "stack": [
+                    f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+                    for frame in task.get_stack()
+                ],
+            },
+        )
+    return sorted(tasks, key=lambda task: task["name"])
+
+
+loop_monitor = LoopMonitor()
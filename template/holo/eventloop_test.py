@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from holo.config import config
+from holo.eventloop import EVENT_LOOP_BLOCKED, LoopMonitor, dump_tasks
+
+
+def blocked_count() -> float:
+    return sum(
+        sample.value
+        for metric in EVENT_LOOP_BLOCKED.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_total") and "eventloop_test.py" in sample.labels["location"]
+    )
+
+
+async def test_blocked_loop(mocker) -> None:
+    """
+    Test blocking the event loop is reported with the blocking location.
+    """
+    mocker.patch.object(config.service, "LOOP_MONITOR_INTERVAL", 0.01)
+    mocker.patch.object(config.service, "LOOP_SLOW_CALLBACK_DURATION", 0.05)
+    count_before = blocked_count()
+    monitor = LoopMonitor()
+
+    await monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        time.sleep(0.3)
+        await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+
+    assert blocked_count() == count_before + 1
+
+
+async def test_dump_tasks() -> None:
+    """
+    Test the dumped tasks include the stack of a suspended task.
+    """
+
+    async def sleeper() -> None:
+        await asyncio.sleep(10)
+
+    task = asyncio.create_task(sleeper(), name="sleeper")
+    await asyncio.sleep(0)
+    try:
+        dumped = {dumped["name"]: dumped for dumped in dump_tasks()}
+    finally:
+        task.cancel()
+
+    assert dumped["sleeper"]["coro"].endswith("sleeper")
+    assert "in sleeper" in dumped["sleeper"]["stack"][0]
@@ -1,6 +1,7 @@
 import asyncio
 import inspect
 from collections.abc import Callable, Coroutine
+from contextlib import suppress
 from datetime import UTC, datetime, timedelta
 from typing import Any
 
@@ -8,12 +9,33 @@ from holo.utils import SingletonMeta
 
 
 class Check:
-    def __init__(self, name: str, func: Callable[[], Coroutine[Any, Any, Any]], timeout: int | None = None) -> None:
+    """
+    A named health check. `interval` is the number of seconds between runs
+    in the background, defaulting to the `cache_ttl` of the checker. Checks
+    with `liveness` are also part of the liveness view, use it for checks
+    of the process itself that a restart can fix, not of its dependencies.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Coroutine[Any, Any, Any]],
+        timeout: int | None = None,
+        interval: float | None = None,
+        liveness: bool = False,
+    ) -> None:
         if not inspect.iscoroutinefunction(func):
             raise TypeError("func must be a Coroutine (async def)")
         self.name = name
         self.func = func
         self.timeout = timeout
+        self.interval = interval
+        self.liveness = liveness
+
+        # Result of the last run and when it finished.
+        self.result: dict[str, Any] | None = None
+        self.checked_at: datetime | None = None
+        self._refresh_task: asyncio.Task[dict[str, Any]] | None = None
 
     async def run(self) -> None:
         if self.timeout:
@@ -21,14 +43,44 @@ class Check:
         else:
             await self.func()
 
+    async def refresh(self) -> dict[str, Any]:
+        """
+        Run the check and keep its result, concurrent calls share a single run.
+        """
+        if not self._refresh_task:
+            self._refresh_task = asyncio.create_task(self._refresh())
+            self._refresh_task.add_done_callback(self._clear_refresh_task)
+        return await asyncio.shield(self._refresh_task)
+
+    def _clear_refresh_task(self, task: asyncio.Task) -> None:
+        self._refresh_task = None
+
+    async def _refresh(self) -> dict[str, Any]:
+        try:
+            await self.run()
+        except Exception as e:
+            error = str(e)
+            if isinstance(e, asyncio.TimeoutError):
+                error = f"check timed out after {self.timeout} seconds"  # noqa
+            elif error == "":
+                error = str(e.__class__)
+            result = {"status": "down", "error": error}
+        else:
+            result = {"status": "up"}
+
+        self.result = result
+        self.checked_at = datetime.now(UTC)
+        return result
+
 
 class HealthChecker:
     def __init__(self, checks: list[Check], timeout: int = 3, cache_ttl: int = 10) -> None:
         self.global_timeout = timeout
         self.cache_ttl = cache_ttl
-        self._cache_invalid_after = datetime.now(UTC)
-        self._cache: dict[str, Any] = {}
+        self._cache_invalid_after: dict[bool, datetime] = {}
+        self._cache: dict[bool, dict[str, Any]] = {}
         self._checks: list[Check] = []
+        self._monitor_tasks: list[asyncio.Task] = []
         self._add_checks(checks)
 
     def _add_checks(self, checks: list[Check]) -> None:
@@ -38,43 +90,73 @@ class HealthChecker:
     def _add_check(self, check: Check) -> None:
         if check.timeout is None:
             check.timeout = self.global_timeout
+        if check.interval is None:
+            check.interval = self.cache_ttl
         self._checks.append(check)
 
-    async def check(self, force_refresh: bool = False) -> dict[str, Any]:
-        now = datetime.now(UTC)
-        if self._cache_invalid_after > now and not force_refresh:
-            return self._cache
+    @property
+    def monitoring(self) -> bool:
+        return bool(self._monitor_tasks)
 
-        health_details: dict[str, Any] = {"status": "up", "details": {}}
+    async def start(self) -> None:
+        """
+        Run every check on its own interval in the background, the health is
+        then served from the last results.
+        """
+        if self._monitor_tasks:
+            return
 
-        results = await asyncio.gather(
-            *[check.run() for check in self._checks],
-            return_exceptions=True,
-        )
+        self._monitor_tasks = [asyncio.create_task(self._monitor(check)) for check in self._checks]
 
-        for i, result in enumerate(results):
-            if isinstance(result, BaseException):
-                error = str(result)
-                health_details["status"] = "down"
+    async def stop(self) -> None:
+        for task in self._monitor_tasks:
+            task.cancel()
+        with suppress(asyncio.CancelledError):
+            await asyncio.gather(*self._monitor_tasks)
+        self._monitor_tasks = []
 
-                if isinstance(result, asyncio.TimeoutError):
-                    error = f"check timed out after {self._checks[i].timeout} seconds"  # noqa
-                elif error == "":
-                    error = str(result.__class__)
+    async def _monitor(self, check: Check) -> None:
+        while True:
+            await check.refresh()
+            await asyncio.sleep(check.interval)
 
-                health_details["details"][self._checks[i].name] = {
-                    "status": "down",
-                    "error": error,
-                }
-            else:
-                health_details["details"][self._checks[i].name] = {
-                    "status": "up",
-                }
+    async def check(self, force_refresh: bool = False) -> dict[str, Any]:
+        """
+        Readiness: the health of all checks.
+        """
+        return await self._report(self._checks, force_refresh, liveness=False)
+
+    async def liveness(self, force_refresh: bool = False) -> dict[str, Any]:
+        """
+        Liveness: the health of the checks with `liveness` only.
+        """
+        return await self._report([check for check in self._checks if check.liveness], force_refresh, liveness=True)
+
+    async def _report(self, checks: list[Check], force_refresh: bool, liveness: bool) -> dict[str, Any]:
+        now = datetime.now(UTC)
+        if self._cache_invalid_after.get(liveness, now) > now and not force_refresh:
+            return self._cache[liveness]
+
+        if self.monitoring and not force_refresh:
+            # Only checks that haven't finished their first run yet are waited for.
+            await asyncio.gather(*(check.refresh() for check in checks if check.result is None))
+        else:
+            await asyncio.gather(*(check.refresh() for check in checks))
+
+        health_details: dict[str, Any] = {"status": "up", "details": {}}
+        for check in checks:
+            health_details["details"][check.name] = check.result
+            if check.result["status"] == "down":
+                health_details["status"] = "down"
 
         now = datetime.now(UTC)
-        health_details["timestamp"] = now
-        self._cache_invalid_after = now + timedelta(seconds=self.cache_ttl)
-        self._cache = health_details
+        if self.monitoring:
+            # The age of the oldest result.
+            health_details["timestamp"] = min((check.checked_at for check in checks), default=now)
+        else:
+            health_details["timestamp"] = now
+            self._cache_invalid_after[liveness] = now + timedelta(seconds=self.cache_ttl)
+            self._cache[liveness] = health_details
 
         return health_details
 
@@ -53,3 +53,51 @@ def test_only_async_func() -> None:
 
     with pytest.raises(TypeError):
         Check(name="not-async", func=not_an_async_check)  # type: ignore[arg-type]
+
+
+async def test_single_flight() -> None:
+    """
+    Test concurrent refreshes share a single run of the check.
+    """
+    runs = 0
+
+    async def counted_check() -> None:
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.1)
+
+    checker = HealthChecker(checks=[Check("counted", counted_check)])
+
+    await asyncio.gather(checker.check(force_refresh=True), checker.check(force_refresh=True))
+
+    assert runs == 1
+
+
+async def test_monitor() -> None:
+    """
+    Test the monitor serves the health from memory, with a separate liveness view.
+    """
+    runs = 0
+
+    async def counted_check() -> None:
+        nonlocal runs
+        runs += 1
+
+    async def failing_check() -> None:
+        raise ValueError("not ready")
+
+    checker = HealthChecker(
+        checks=[Check("counted", counted_check, interval=60, liveness=True), Check("failing", failing_check)],
+    )
+    await checker.start()
+    try:
+        readiness = await checker.check()
+        liveness = await checker.liveness()
+    finally:
+        await checker.stop()
+
+    assert runs == 1
+    assert readiness["status"] == "down"
+    assert readiness["details"]["failing"] == {"status": "down", "error": "not ready"}
+    assert liveness["status"] == "up"
+    assert liveness["details"] == {"counted": {"status": "up"}}
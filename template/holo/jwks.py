@@ -0,0 +1,128 @@
+"""
+Keeps the public keys (jwks) of the auth service that signs the JWTs up to
+date in the background.
+"""
+
+import asyncio
+import logging
+from contextlib import suppress
+from time import monotonic, time
+
+import aiohttp
+import jwt
+from prometheus_client import Counter, Gauge
+
+from holo.config import config
+from holo.workers import set_gauge_function
+
+
+logger = logging.getLogger(__name__)
+
+JWKS_FETCH_FAILURES = Counter("jwks_fetch_failures_total", "Total count of failed attempts to fetch the jwks")
+JWKS_AGE = Gauge(
+    "jwks_age_seconds",
+    "Gauge of seconds since the jwks were last fetched successfully",
+    multiprocess_mode="liveall",
+)
+
+# Seconds to wait before retrying a failed fetch in the background.
+RETRY_INTERVAL = 10
+
+
+class JWKSRefresher:
+    """
+    Keeps the last successfully fetched jwks while refreshing them every
+    JWKS_REFRESH_INTERVAL seconds in the background, so a failing auth
+    service never delays requests or disables signature verification.
+
+    An unknown kid triggers a refetch, at most once every
+    JWKS_MIN_REFETCH_INTERVAL seconds.
+    """
+
+    def __init__(self) -> None:
+        self.jwk_set: jwt.PyJWKSet | None = None
+        self._fetched_time = 0.0
+        self._last_attempt = -float("inf")
+        self._fetch_task: asyncio.Task | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+        set_gauge_function(JWKS_AGE, lambda: time() - self._fetched_time if self.jwk_set else float("nan"))
+
+    @property
+    def enabled(self) -> bool:
+        return bool(config.service.AUTH_BASE_URL)
+
+    async def start(self) -> None:
+        """
+        Fetch the jwks and keep refreshing them in the background.
+        """
+        if not self.enabled or self._refresh_task:
+            return
+
+        await self.fetch()
+        self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def stop(self) -> None:
+        # The fetch is shielded from the refresh task, so it's cancelled separately.
+        for task in (self._refresh_task, self._fetch_task):
+            if task:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        self._refresh_task = None
+
+    async def get_jwk(self, kid: str | None) -> jwt.PyJWK:
+        """
+        Return the jwk for `kid`, refetching the jwks once when it's unknown.
+
+        Raises:
+            KeyError: When there is no jwk for `kid`.
+        """
+        if self.jwk_set is not None:
+            with suppress(KeyError):
+                return self.jwk_set[kid]
+
+        if self._fetch_task or monotonic() - self._last_attempt >= config.service.JWKS_MIN_REFETCH_INTERVAL:
+            await self.fetch()
+
+        if self.jwk_set is None:
+            raise KeyError(kid)
+        return self.jwk_set[kid]
+
+    async def fetch(self) -> bool:
+        """
+        Fetch the jwks, concurrent calls share a single fetch. Returns whether
+        the fetch succeeded.
+        """
+        if not self._fetch_task:
+            self._fetch_task = asyncio.create_task(self._fetch())
+            self._fetch_task.add_done_callback(self._clear_fetch_task)
+        return await asyncio.shield(self._fetch_task)
+
+    def _clear_fetch_task(self, task: asyncio.Task) -> None:
+        self._fetch_task = None
+
+    async def _fetch(self) -> bool:
+        self._last_attempt = monotonic()
+        jwks_url = f"{config.service.AUTH_BASE_URL}/jwks"
+        try:
+            async with aiohttp.request("GET", jwks_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                response.raise_for_status()
+                self.jwk_set = jwt.PyJWKSet.from_dict(await response.json())
+        except Exception:
+            JWKS_FETCH_FAILURES.inc()
+            logger.exception("Failed to get jwks from %s", jwks_url)
+            return False
+
+        self._fetched_time = time()
+        return True
+
+    async def _refresh(self) -> None:
+        while True:
+            if time() - self._fetched_time < config.service.JWKS_REFRESH_INTERVAL:
+                await asyncio.sleep(config.service.JWKS_REFRESH_INTERVAL - (time() - self._fetched_time))
+            elif not await self.fetch():
+                await asyncio.sleep(RETRY_INTERVAL)
+
+
+jwks = JWKSRefresher()
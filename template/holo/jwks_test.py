@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from holo.config import config
+from holo.jwks import JWKSRefresher
+
+
+JWKS = {"keys": [{"kty": "oct", "kid": "key-1", "alg": "HS256", "k": "c29tZS1zZWNyZXQtdGhhdC1pcy1sb25nLWVub3VnaA"}]}
+
+
+@pytest.fixture
+def auth_url(mocker) -> str:
+    mocker.patch.object(config.service, "AUTH_BASE_URL", "http://auth.test")
+    return "http://auth.test/jwks"
+
+
+async def test_keeps_last_jwks(aioresponse, auth_url) -> None:
+    """
+    Test the last fetched jwks are kept when refreshing them fails.
+    """
+    aioresponse.get(auth_url, payload=JWKS)
+    aioresponse.get(auth_url, status=500)
+    refresher = JWKSRefresher()
+
+    assert await refresher.fetch()
+    assert not await refresher.fetch()
+    assert (await refresher.get_jwk("key-1")).key_id == "key-1"
+
+
+async def test_unknown_kid_refetch(aioresponse, auth_url, mocker) -> None:
+    """
+    Test an unknown kid refetches the jwks, but not more than once per interval.
+    """
+    mocker.patch.object(config.service, "JWKS_MIN_REFETCH_INTERVAL", 60)
+    aioresponse.get(auth_url, status=500)
+    aioresponse.get(auth_url, payload=JWKS)
+    refresher = JWKSRefresher()
+
+    with pytest.raises(KeyError):
+        await refresher.get_jwk("key-1")
+
+    # Within the interval, so no second request.
+    with pytest.raises(KeyError):
+        await refresher.get_jwk("key-1")
+
+    refresher._last_attempt -= 60
+
+    assert (await refresher.get_jwk("key-1")).key_id == "key-1"
+
+
+async def test_stop_cancels_fetch(mocker) -> None:
+    """
+    Test stopping cancels a fetch in progress.
+    """
+    refresher = JWKSRefresher()
+    mocker.patch.object(refresher, "_fetch", side_effect=lambda: asyncio.sleep(60, True))
+    fetch = asyncio.create_task(refresher.fetch())
+    await asyncio.sleep(0)
+    fetch_task = refresher._fetch_task
+
+    await refresher.stop()
+
+    assert fetch_task.cancelled()
+    assert refresher._fetch_task is None
+    with pytest.raises(asyncio.CancelledError):
+        await fetch
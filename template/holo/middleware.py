@@ -0,0 +1,154 @@
+"""
+A single ASGI middleware for the request hot path, doing the work of
+ASGIContextMiddleware, PrometheusMiddleware, AccessLoggerMiddleware and
+SegmentASGIMiddleware in one pass over the request headers.
+"""
+
+import logging
+from collections.abc import Collection
+from time import perf_counter
+
+from jwt.exceptions import DecodeError
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from starlette_prometheus.middleware import (
+    EXCEPTIONS,
+    REQUESTS,
+    REQUESTS_IN_PROGRESS,
+    REQUESTS_PROCESSING_TIME,
+    RESPONSES,
+)
+
+from holo.ctx import MALFORMED_AUTH_HEADER_RESPONSE, ASGIContextMiddleware, get_bearer_token, request_context
+from holo.segment.middleware import build_segment, set_segment_user_id, track_segment_event
+
+
+access_logger = logging.getLogger("access")
+
+FEATURES = frozenset({"jwt", "metrics", "access_log", "segment"})
+
+
+class HoloASGIMiddleware(ASGIContextMiddleware):
+    """
+    Set up `context` for every request, and do the work of the enabled
+    `features` in the same pass.
+
+    - jwt: decode the bearer token into `context.raw["jwt_dict"]`.
+    - metrics: count and time requests with the starlette_prometheus metrics.
+    - access_log: log a line per request to the "access" logger.
+    - segment: send the X-Segment event of successful requests to segment.
+
+    The metrics and log lines are the same as those of the separate
+    middlewares, except that a malformed Authorization header is counted
+    and logged too.
+    """
+
+    def __init__(self, app: ASGIApp, features: str | Collection[str] = FEATURES) -> None:
+        super().__init__(app)
+        if isinstance(features, str):
+            features = {feature.strip() for feature in features.split(",") if feature.strip()}
+        if unknown := set(features) - FEATURES:
+            raise ValueError(f"Unknown middleware features: {', '.join(sorted(unknown))}")
+
+        self.jwt = "jwt" in features
+        self.metrics = "metrics" in features
+        self.access_log = "access_log" in features
+        self.segment = "segment" in features
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        is_http = scope["type"] == "http"
+
+        # Parse the headers once for all features, header names are lowercase in ASGI.
+        auth_header = None
+        user_agent = "-"
+        segment_headers = {}
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = auth_header or value.decode("latin-1")
+            elif name == b"user-agent":
+                user_agent = value.decode("latin-1")
+            elif name.startswith(b"x-segment-"):
+                segment_headers[name[10:].decode("latin-1")] = value.decode("latin-1")
+
+        ctx = {}
+        if is_http and self.segment:
+            ctx["segment"] = build_segment(segment_headers)
+
+        status_code = 500
+        before_time = perf_counter()
+        if is_http and self.metrics:
+            method = scope["method"]
+            path_template = self.__get_path_template(scope)
+            REQUESTS_IN_PROGRESS.labels(method=method, path_template=path_template).inc()
+            REQUESTS.labels(method=method, path_template=path_template).inc()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.metrics:
+                    REQUESTS_PROCESSING_TIME.labels(method=method, path_template=path_template).observe(
+                        perf_counter() - before_time,
+                    )
+                if self.segment:
+                    track_segment_event(status_code)
+            await send(message)
+
+        try:
+            with request_context(ctx):
+                try:
+                    if self.jwt and (encoded_token := get_bearer_token(auth_header)):
+                        ctx["auth_header"] = f"Bearer {encoded_token}"
+                        ctx["jwt_dict"] = await self.decode_token(encoded_token)  # Raises DecodeError.
+                except DecodeError:
+                    await MALFORMED_AUTH_HEADER_RESPONSE(scope, receive, send_wrapper if is_http else send)
+                else:
+                    if is_http and self.segment:
+                        set_segment_user_id()
+                    await self.app(scope, receive, send_wrapper if is_http else send)
+        except BaseException as e:
+            status_code = 500
+            if is_http and self.metrics:
+                EXCEPTIONS.labels(method=method, path_template=path_template, exception_type=type(e).__name__).inc()
+            raise
+        finally:
+            if is_http and self.metrics:
+                RESPONSES.labels(method=method, path_template=path_template, status_code=status_code).inc()
+                REQUESTS_IN_PROGRESS.labels(method=method, path_template=path_template).dec()
+            if is_http and self.access_log:
+                self.__log_access(scope, status_code, user_agent)
+
+    @staticmethod
+    def __get_path_template(scope: Scope) -> str:
+        for route in scope["app"].routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return scope["path"]
+
+    @staticmethod
+    def __log_access(scope: Scope, status_code: int, user_agent: str) -> None:
+        """
+        Log the request in the format '%(h)s %(l)s "%(R)s" %(s)s "%(a)s"' of
+        AccessLoggerMiddleware.
+        """
+        if not access_logger.isEnabledFor(logging.INFO):
+            return
+
+        client = "{}:{}".format(*scope["client"]) if scope.get("client") else "-"
+        path = scope["root_path"] + scope["path"]
+        if query_string := scope["query_string"]:
+            path = f"{path}?{query_string.decode('latin-1')}"
+        access_logger.info(
+            '%s - "%s %s HTTP/%s" %d "%s"',
+            client,
+            scope["method"],
+            path,
+            scope["http_version"],
+            status_code,
+            user_agent,
+        )
@@ -1,95 +1,200 @@
 import os
 import re
-from collections import defaultdict
-from functools import lru_cache
+import threading
+from collections import OrderedDict
 
 from opentelemetry.context import Context
 from opentelemetry.sdk.trace import ReadableSpan, Span
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.semconv._incubating.attributes.peer_attributes import PEER_SERVICE
+from opentelemetry.trace import StatusCode
+from prometheus_client import Counter
+
+
+TRACES_SAMPLED = Counter(
+    "tracing_traces_sampled_total",
+    "Total count of local traces by tail sampling decision: error, latency, rate or dropped",
+    ["decision"],
+)
+SPANS_DROPPED = Counter(
+    "tracing_spans_dropped_total",
+    "Total count of spans dropped by tail sampling by reason: sampled or overflow",
+    ["reason"],
+)
 
 
 class SpanChildCountProcessorMixin:
     """
     Track "child_span_count" which adds an attribute with the number of
     local child spans. This can be used to query big traces in Tempo.
+
+    Counts are kept for at most `max_traces` traces, the oldest are dropped
+    when root spans don't end in this process.
     """
 
-    _span_counts: dict[int, int] = defaultdict(int)
+    def __init__(self, *args, max_traces: int = 10000, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._max_traces = max_traces
+        self._span_counts: OrderedDict[int, int] = OrderedDict()
+        self._span_counts_lock = threading.Lock()
 
-    def on_start(self, span: Span, parent_context: Context | None) -> None:
+    def on_start(self, span: Span, parent_context: Context | None = None) -> None:
         if span.parent and not span.parent.is_remote:
-            self._span_counts[span.context.trace_id] += 1
-        super().on_start(span)
+            trace_id = span.context.trace_id
+            with self._span_counts_lock:
+                self._span_counts[trace_id] = self._span_counts.get(trace_id, 0) + 1
+                if len(self._span_counts) > self._max_traces:
+                    self._span_counts.popitem(last=False)
+        super().on_start(span, parent_context)
 
-    def on_end(self, span: ReadableSpan) -> None:
+    def _pop_span_count(self, span: ReadableSpan) -> int:
+        """
+        Pop the number of local child spans when `span` is a local root span.
+        """
         if span.parent is None or span.parent.is_remote:
-            span_count = self._span_counts.pop(span.context.trace_id, 0)
-            if span_count:
-                # `set_attribute` doesn't work in `on_end`.
-                span._attributes["child_span_count"] = span_count
+            with self._span_counts_lock:
+                return self._span_counts.pop(span.context.trace_id, 0)
+        return 0
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span_count := self._pop_span_count(span):
+            # `set_attribute` doesn't work in `on_end`.
+            span._attributes["child_span_count"] = span_count
 
         super().on_end(span)
 
 
-class PeerSpanProcessor(SpanChildCountProcessorMixin, BatchSpanProcessor):
+class TailSamplingProcessorMixin:
+    """
+    Buffer the ended spans of every local trace until its root span ends,
+    then export the trace when it has an error, when the root took at least
+    `latency_threshold` seconds, or for the `sample_rate` fraction of the
+    trace ids. Every span is exported when `sample_rate` is 1.
+
+    At most `max_buffered_spans` spans are buffered, the spans of the oldest
+    traces are dropped first. Spans ending after their root, like those of
+    background tasks, follow the decision of the root.
+    """
+
+    def __init__(
+        self,
+        *args,
+        sample_rate: float = 1.0,
+        latency_threshold: float | None = None,
+        max_buffered_spans: int = 10000,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self._sample_rate = sample_rate
+        # The lower 64 bits of W3C trace ids are random, like TraceIdRatioBased.
+        self._sample_bound = round(sample_rate * 2**64)
+        self._latency_threshold = None if latency_threshold is None else int(latency_threshold * 1e9)
+        self._max_buffered_spans = max_buffered_spans
+        self._buffered_spans = 0
+        self._traces: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        # Decisions of the last `max_buffered_spans` ended traces, for spans ending after their root.
+        self._decisions: OrderedDict[int, bool] = OrderedDict()
+        self._traces_lock = threading.Lock()
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if self._sample_rate >= 1 or not span.context.trace_flags.sampled:
+            super().on_end(span)
+            return
+
+        trace_id = span.context.trace_id
+        with self._traces_lock:
+            if span.parent is None or span.parent.is_remote:
+                spans = self._traces.pop(trace_id, [])
+                self._buffered_spans -= len(spans)
+                spans.append(span)
+                keep = self._decide(trace_id, spans, span)
+                self._decisions[trace_id] = keep
+                if len(self._decisions) > self._max_buffered_spans:
+                    self._decisions.popitem(last=False)
+            elif (keep := self._decisions.get(trace_id)) is not None:
+                spans = [span]
+            else:
+                self._buffer(trace_id, span)
+                return
+
+        if keep:
+            for kept_span in spans:
+                super().on_end(kept_span)
+        else:
+            SPANS_DROPPED.labels(reason="sampled").inc(len(spans))
+
+    def _decide(self, trace_id: int, spans: list[ReadableSpan], root: ReadableSpan) -> bool:
+        if any(span.status.status_code is StatusCode.ERROR for span in spans):
+            decision = "error"
+        elif self._latency_threshold is not None and root.end_time - root.start_time >= self._latency_threshold:
+            decision = "latency"
+        elif trace_id & 0xFFFFFFFFFFFFFFFF < self._sample_bound:
+            decision = "rate"
+        else:
+            decision = "dropped"
+        TRACES_SAMPLED.labels(decision=decision).inc()
+        return decision != "dropped"
+
+    def _buffer(self, trace_id: int, span: ReadableSpan) -> None:
+        self._traces.setdefault(trace_id, []).append(span)
+        self._buffered_spans += 1
+        while self._buffered_spans > self._max_buffered_spans:
+            _, spans = self._traces.popitem(last=False)
+            self._buffered_spans -= len(spans)
+            SPANS_DROPPED.labels(reason="overflow").inc(len(spans))
+
+
+class PeerSpanProcessor(SpanChildCountProcessorMixin, TailSamplingProcessorMixin, BatchSpanProcessor):
     EXCLUDED_SPAN_NAMES = ["PING"]
     EXCLUDED_NONE_PARENT_SPAN_NAMES = ["connect", "SELECT.*"]
 
+    PEER_SERVICE_SUFFIXES = {
+        "opentelemetry.instrumentation.sqlalchemy": "-db",
+        "opentelemetry.instrumentation.redis": "-redis",
+    }
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._excluded_span_names = self._compile_excluded_names(
+            self.EXCLUDED_SPAN_NAMES,
+            "TRACING_EXCLUDED_SPAN_NAMES",
+        )
+        self._excluded_none_parent_span_names = self._compile_excluded_names(
+            self.EXCLUDED_NONE_PARENT_SPAN_NAMES,
+            "TRACING_EXCLUDED_NONE_PARENT_SPAN_NAMES",
+        )
+
     def on_start(self, span: Span, parent_context: Context | None = None) -> None:
         """
         Add peer service attribute to spans when they are intrumented by sqlachemy or redis.
         This is needed by tempo to generate the service graph properly.
         """
-        if span.instrumentation_scope.name == "opentelemetry.instrumentation.sqlalchemy":
-            span.set_attribute(PEER_SERVICE, f"{span.resource.attributes['service.name']}-db")
-        elif span.instrumentation_scope.name == "opentelemetry.instrumentation.redis":
-            span.set_attribute(PEER_SERVICE, f"{span.resource.attributes['service.name']}-redis")
+        if suffix := self.PEER_SERVICE_SUFFIXES.get(span.instrumentation_scope.name):
+            span.set_attribute(PEER_SERVICE, f"{span.resource.attributes['service.name']}{suffix}")
         super().on_start(span, parent_context)
 
-    @lru_cache
-    def _get_excluded_span_names(self) -> list[str]:
+    @staticmethod
+    def _compile_excluded_names(default_names: list[str], env_var: str) -> re.Pattern[str]:
         """
-        Get a list of span names to exclude from tracing.
-        List of spans found in the `TRACING_EXCLUDED_SPAN_NAMES` environment variable will be appended to the
-        default values.
+        Compile the span names to exclude into a single regex matching at the
+        start of a span name, like `re.match`.
+        The regexes found in the `env_var` environment variable are appended to the default values.
         The value of the environment variable must be a comma separated list of regexes.
         """
-        env_excluded_names = os.getenv("TRACING_EXCLUDED_SPAN_NAMES", "")
-        if not env_excluded_names:
-            return self.EXCLUDED_SPAN_NAMES
-        if env_excluded_names.endswith(","):
-            env_excluded_names = env_excluded_names[:-1]
-        list_of_excluded = self.EXCLUDED_SPAN_NAMES + env_excluded_names.split(",")
-        return list_of_excluded
-
-    @lru_cache
-    def _get_excluded_none_parent_span_names(self) -> list[str]:
-        """
-        Get a list of span names which will be excluded from tracing if they don't have a parent.
-        List of spans found in the `TRACING_EXCLUDED_NONE_PARENT_SPAN_NAMES` environment variable will be appended to
-        the default values.
-        The value of the environment variable must be a comma separated list of regexes.
-        """
-        env_excluded_names = os.getenv("TRACING_EXCLUDED_NONE_PARENT_SPAN_NAMES", "")
-        if not env_excluded_names:
-            return self.EXCLUDED_NONE_PARENT_SPAN_NAMES
-        if env_excluded_names.endswith(","):
-            env_excluded_names = env_excluded_names[:-1]
-        list_of_excluded = self.EXCLUDED_NONE_PARENT_SPAN_NAMES + env_excluded_names.split(",")
-        return list_of_excluded
+        env_excluded_names = [name for name in os.getenv(env_var, "").split(",") if name]
+        return re.compile("|".join(f"(?:{name})" for name in default_names + env_excluded_names) or "(?!)")
 
     def on_end(self, span: ReadableSpan) -> None:
         """
         Exclude spans from tracing based on their name.
-        Spans which name is matching the regex list from `_get_excluded_span_names` will be excluded.
-        Spans which name is matching the regex list from `_get_excluded_none_parent_span_names` and don't have
-        a parent will also be excluded.
+        Spans which name is matching `EXCLUDED_SPAN_NAMES` or `TRACING_EXCLUDED_SPAN_NAMES` will be excluded.
+        Spans which name is matching `EXCLUDED_NONE_PARENT_SPAN_NAMES` or `TRACING_EXCLUDED_NONE_PARENT_SPAN_NAMES`
+        and don't have a parent will also be excluded.
         """
-        for regex in self._get_excluded_span_names():
-            if re.match(regex, span.name):
-                return
-        for regex in self._get_excluded_none_parent_span_names():
-            if re.match(regex, span.name) and span.parent is None:
-                return
+        if self._excluded_span_names.match(span.name) or (
+            span.parent is None and self._excluded_none_parent_span_names.match(span.name)
+        ):
+            # Drop the child count of an excluded root span, nothing else pops it.
+            self._pop_span_count(span)
+            return
         super().on_end(span)
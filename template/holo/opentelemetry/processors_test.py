@@ -0,0 +1,105 @@
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import StatusCode, set_span_in_context
+
+from holo.opentelemetry.processors import PeerSpanProcessor
+
+
+def test_excluded_span_names(monkeypatch) -> None:
+    """
+    Test spans are excluded by name, and by name without parent, including
+    the names of the environment variables.
+    """
+    monkeypatch.setenv("TRACING_EXCLUDED_SPAN_NAMES", "GET /health.*,")
+    exporter = InMemorySpanExporter()
+    processor = PeerSpanProcessor(exporter)
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+
+    with tracer.start_as_current_span("connect"):
+        pass
+    with tracer.start_as_current_span("GET /health/ready"):
+        pass
+    with tracer.start_as_current_span("handler"):
+        with tracer.start_as_current_span("connect"):
+            pass
+        with tracer.start_as_current_span("PING"):
+            pass
+    provider.force_flush()
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert list(spans) == ["connect", "handler"]
+    assert spans["connect"].parent is not None
+    assert spans["handler"].attributes["child_span_count"] == 2
+    assert not processor._span_counts
+    provider.shutdown()
+
+
+def test_span_counts_bounded() -> None:
+    """
+    Test child span counts are kept for at most `max_traces` traces.
+    """
+    processor = PeerSpanProcessor(InMemorySpanExporter(), max_traces=2)
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+
+    roots = [tracer.start_span("root") for _ in range(3)]
+    for root in roots:
+        with tracer.start_as_current_span("child", context=set_span_in_context(root)):
+            pass
+
+    assert list(processor._span_counts) == [roots[1].context.trace_id, roots[2].context.trace_id]
+    provider.shutdown()
+
+
+def test_tail_sampling() -> None:
+    """
+    Test only traces with errors or slow roots are exported without base
+    rate, with their child span count, and spans ending after their root
+    follow its decision.
+    """
+    exporter = InMemorySpanExporter()
+    processor = PeerSpanProcessor(exporter, sample_rate=0, latency_threshold=1)
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+
+    with tracer.start_as_current_span("fast"):
+        with tracer.start_as_current_span("fast child"):
+            pass
+    with tracer.start_as_current_span("error"):
+        with tracer.start_as_current_span("error child") as child:
+            child.set_status(StatusCode.ERROR)
+        late_child = tracer.start_span("late child")
+    late_child.end()
+    slow = tracer.start_span("slow", start_time=0)
+    slow.end(end_time=2_000_000_000)
+    provider.force_flush()
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert list(spans) == ["error child", "error", "late child", "slow"]
+    assert spans["error"].attributes["child_span_count"] == 2
+    assert not processor._traces
+    provider.shutdown()
+
+
+def test_tail_sampling_bounded() -> None:
+    """
+    Test the spans of the oldest traces are dropped when too many spans are buffered.
+    """
+    processor = PeerSpanProcessor(InMemorySpanExporter(), sample_rate=0, max_buffered_spans=2)
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+
+    roots = [tracer.start_span("root") for _ in range(2)]
+    for root in roots:
+        for _ in range(2):
+            with tracer.start_as_current_span("child", context=set_span_in_context(root)):
+                pass
+
+    assert list(processor._traces) == [roots[1].context.trace_id]
+    assert processor._buffered_spans == 2
+    provider.shutdown()
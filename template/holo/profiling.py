@@ -0,0 +1,230 @@
+"""
+In-process CPU and allocation profiling, for environments where no
+profiler can be attached to the process.
+"""
+
+import asyncio
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+from types import FrameType
+from typing import Any
+
+from holo import serialization
+
+
+# A frame of a stack: function name, file name and first line of the function.
+type Frame = tuple[str, str, int]
+type Stack = tuple[Frame, ...]
+
+# Profiles change global state (tracemalloc), so only one runs at a time.
+_lock = asyncio.Lock()
+
+
+class StackSampler:
+    """
+    Samples the stacks of all threads every `interval` seconds from a
+    separate thread, counting how often every stack is seen.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.stacks: Counter[Stack] = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._started_time = perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.duration = perf_counter() - self._started_time
+
+    def _run(self) -> None:
+        sampler_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            self.samples += 1
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != sampler_id:
+                    thread = (f"thread {thread_names.get(thread_id, thread_id)}", "", 0)
+                    self.stacks[(thread, *_stack(frame))] += 1
+
+    def collapsed(self) -> str:
+        """
+        The stacks in the collapsed format of flamegraph.pl and speedscope,
+        a line per stack with its frames from the root separated by `;`.
+        """
+        return "".join(
+            f"{';'.join(_frame_name(frame) for frame in stack)} {count}\n" for stack, count in self.stacks.items()
+        )
+
+    def speedscope(self, name: str = "profile") -> dict[str, Any]:
+        """
+        The stacks as a sampled profile in the file format of speedscope.app,
+        weighed by seconds. Samples are taken less often than `interval` when
+        threads hold the GIL, so the weight is the measured time per sample.
+        """
+        sample_duration = self.duration / self.samples if self.samples else self.interval
+        frames: dict[Frame, int] = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * sample_duration)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {
+                "frames": [
+                    {"name": function, "file": file, "line": line} if file else {"name": function}
+                    for function, file, line in frames
+                ],
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                },
+            ],
+            "name": name,
+        }
+
+
+def _stack(frame: FrameType | None) -> list[Frame]:
+    """
+    The frames of the stack of `frame`, from the root.
+    """
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _frame_name(frame: Frame) -> str:
+    function, file, line = frame
+    return f"{function} ({file}:{line})" if file else function
+
+
+class AllocationTracker:
+    """
+    Compares the memory allocated between `start` and `stop` with
+    tracemalloc, keeping `frames` frames per allocation.
+    """
+
+    def __init__(self, frames: int = 1) -> None:
+        self.frames = frames
+        self._started_tracing = False
+        self._snapshot: tracemalloc.Snapshot | None = None
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        self._snapshot = self._take_snapshot()
+
+    def stop(self, limit: int = 25) -> list[dict[str, Any]]:
+        """
+        The `limit` locations whose allocated memory grew the most.
+        """
+        snapshot = self._take_snapshot()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+        key_type = "traceback" if self.frames > 1 else "lineno"
+        return [
+            {
+                "location": [str(frame) for frame in stat.traceback],
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            for stat in snapshot.compare_to(self._snapshot, key_type)[:limit]
+        ]
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ),
+        )
+
+
+async def profile_cpu(seconds: float, interval: float = 0.005) -> StackSampler:
+    """
+    Sample the stacks of all threads for `seconds` seconds.
+    """
+    async with _lock:
+        sampler = StackSampler(interval)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+        return sampler
+
+
+async def profile_memory(seconds: float, limit: int = 25, frames: int = 1) -> list[dict[str, Any]]:
+    """
+    The `limit` locations whose allocated memory grew the most in `seconds`
+    seconds.
+    """
+    async with _lock:
+        tracker = AllocationTracker(frames)
+        tracker.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            result = tracker.stop(limit)
+        return result
+
+
+@contextmanager
+def profile_to_files(cpu_file: str | None = None, memory_file: str | None = None) -> Iterator[None]:
+    """
+    Profile the block, writing the stacks to `cpu_file`, as speedscope JSON
+    for .json files and collapsed stacks otherwise, and the memory growth as
+    JSON to `memory_file`.
+    """
+    sampler = StackSampler() if cpu_file else None
+    tracker = AllocationTracker() if memory_file else None
+    if sampler:
+        sampler.start()
+    if tracker:
+        tracker.start()
+    try:
+        yield
+    finally:
+        if sampler:
+            sampler.stop()
+            if cpu_file.endswith(".json"):
+                Path(cpu_file).write_bytes(serialization.codec.dumps(sampler.speedscope(Path(cpu_file).stem)))
+            else:
+                Path(cpu_file).write_text(sampler.collapsed())
+        if tracker:
+            Path(memory_file).write_bytes(serialization.codec.dumps(tracker.stop()))
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from holo.profiling import profile_cpu, profile_memory
+
+
+def busy_wait(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def test_profile_cpu() -> None:
+    """
+    Test a function keeping a thread busy shows up in the sampled stacks.
+    """
+    task = asyncio.create_task(asyncio.to_thread(busy_wait, 0.2))
+    sampler = await profile_cpu(0.1, interval=0.001)
+    await task
+
+    assert "busy_wait" in sampler.collapsed()
+
+    profile = sampler.speedscope("test")
+    frame_names = [frame["name"] for frame in profile["shared"]["frames"]]
+    assert "busy_wait" in frame_names
+    assert profile["profiles"][0]["endValue"] > 0
+
+
+async def test_profile_memory() -> None:
+    """
+    Test memory allocated while profiling is reported with its location.
+    """
+    allocated = []
+
+    async def allocate() -> None:
+        await asyncio.sleep(0.01)
+        allocated.append(bytearray(10_000_000))
+
+    task = asyncio.create_task(allocate())
+    growth = await profile_memory(0.05)
+    await task
+
+    assert growth[0]["size_diff"] >= 10_000_000
+    assert "profiling_test.py" in growth[0]["location"][0]
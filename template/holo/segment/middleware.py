@@ -1,17 +1,86 @@
-import hashlib
 import logging
 
-from segment import analytics
-from starlette.requests import Request
 from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from holo.config import config
 from holo.ctx import context
+from holo.segment.sink import segment_sink
 
 
 logger = logging.getLogger(__name__)
 
 
+def build_segment(segment_headers: dict[str, str]) -> dict:
+    """
+    Build the kwargs of `segment_sink.track` from the X-Segment headers, by
+    their name without the `x-segment-` prefix.
+    """
+    if not segment_headers:
+        return {"context": {"app": {"name": config.service.SERVICE_NAME}}}
+
+    segment = {}
+
+    # Separate identity, event, and context.
+    segment_user_id = segment_headers.pop("user-id", None)
+    segment_event = segment_headers.pop("event", None)
+    segment_context = {}
+    for name in list(segment_headers.keys()):
+        if name.startswith("context-"):
+            value = segment_headers.pop(name)
+            parts = name.split("-")[1:]
+            c = segment_context
+            for i, part in enumerate(parts, start=1):
+                if part not in c and i < len(parts):
+                    c[part] = {}
+                    c = c[part]
+                else:
+                    c[part] = value
+
+    if segment_headers:
+        logger.warning(
+            "Discarded X-Segment headers: %s",
+            ",".join(sorted(f"'{header}'" for header in segment_headers)),
+        )
+
+    # Without a user id header, `context.segment_user_id` is only hashed
+    # for requests with an event, see `set_segment_user_id`.
+    if segment_user_id:
+        segment["user_id"] = segment_user_id
+    if segment_context:
+        segment["context"] = segment_context
+    if "context" not in segment or "app" not in segment["context"] or "name" not in segment["context"]["app"]:
+        segment["context"] = {"app": {"name": config.service.SERVICE_NAME}}
+    if segment_event:
+        segment["event"] = segment_event
+    return segment
+
+
+def set_segment_user_id() -> None:
+    """
+    Default the user id of the event in `context.raw["segment"]` to the hash
+    of the JWT subject, once the JWT is decoded.
+    """
+    segment = context.raw["segment"]
+    if "event" in segment and "user_id" not in segment and (user_id := context.segment_user_id):
+        segment["user_id"] = user_id
+
+
+def track_segment_event(status: int) -> None:
+    """
+    Queue the event set in `context.raw["segment"]` for segment, when the
+    response with `status` was successful.
+    """
+    success = 200 <= status < 400
+    if success and "event" in context.raw["segment"]:
+        # The event may have been set by the view.
+        set_segment_user_id()
+        try:
+            # Only queues the event, it's uploaded in the background.
+            segment_sink.track(**context.raw["segment"])
+        except Exception as e:
+            logger.exception("Error occurred during send for Segment.", exc_info=e)
+
+
 class SegmentASGIMiddleware:
     """
     Send events to segment if events were set in `context`.
@@ -22,6 +91,9 @@ class SegmentASGIMiddleware:
     from holo.ctx import context
     context.raw["segment"][kwarg] = value
     ```
+
+    `user_id` is set before the view when the request has an X-Segment-Event
+    header, when the view sets the event it's only set when tracking it.
     """
 
     def __init__(self, app: ASGIApp) -> None:
@@ -32,74 +104,29 @@ class SegmentASGIMiddleware:
             await self.app(scope, receive, send)
             return
 
-        request = Request(scope)
-
-        context.raw["segment"] = {}
-
-        # Convert headers to segment properties.
-        segment_headers = {k[10:]: v for k, v in request.headers.items() if k.startswith("x-segment-")}
-
-        # Separate identity, event, and context.
-        segment_user_id = segment_headers.pop("user-id", None)
-        segment_event = segment_headers.pop("event", None)
-        segment_context = {}
-        for name in list(segment_headers.keys()):
-            if name.startswith("context-"):
-                value = segment_headers.pop(name)
-                parts = name.split("-")[1:]
-                c = segment_context
-                for i, part in enumerate(parts, start=1):
-                    if part not in c and i < len(parts):
-                        c[part] = {}
-                        c = c[part]
-                    else:
-                        c[part] = value
-
-        if segment_headers:
-            logger.warning(
-                "Discarded X-Segment headers: %s",
-                ",".join(sorted(f"'{header}'" for header in segment_headers)),
+        try:
+            context.raw["segment"] = {}
+        except LookupError:
+            raise ValueError(
+                "Cannot access `context.raw`. Make sure to check the relative "
+                "position to ASGIContextMiddleware in the order of middlewares.",
             )
 
-        if segment_user_id is None:
-            try:
-                vg_user_uuid = context.raw["jwt_dict"]["sub"]
-                segment_user_id = hashlib.sha256(vg_user_uuid.encode()).hexdigest()
-            except KeyError:
-                segment_user_id = None
-            except LookupError:
-                raise ValueError(
-                    "Cannot access `context.raw`. Make sure to check the relative "
-                    "position to ASGIContextMiddleware in the order of middlewares.",
-                )
-
-        if segment_user_id:
-            context.raw["segment"]["user_id"] = segment_user_id
-        if segment_context:
-            context.raw["segment"]["context"] = segment_context
-        if (
-            "context" not in context.raw["segment"]
-            or "app" not in context.raw["segment"]["context"]
-            or "name" not in context.raw["segment"]["context"]["app"]
-        ):
-            context.raw["segment"]["context"] = {"app": {"name": config.service.SERVICE_NAME}}
-        if segment_event:
-            context.raw["segment"]["event"] = segment_event
+        # Convert headers to segment properties, header names are lowercase in ASGI.
+        headers = scope["headers"]
+        segment_headers = {}
+        if any(name.startswith(b"x-segment-") for name, _ in headers):
+            segment_headers = {
+                name[10:].decode("latin-1"): value.decode("latin-1")
+                for name, value in headers
+                if name.startswith(b"x-segment-")
+            }
+        context.raw["segment"] = build_segment(segment_headers)
+        set_segment_user_id()
 
         async def send_wrapper(message: Message) -> None:
             if message["type"] == "http.response.start":
-                success = 200 <= message["status"] < 400
-                if success and "event" in context.raw["segment"]:
-                    try:
-                        # .track() will queue an async request to segment,
-                        # if we notice not all requests are sent, use
-                        # .flush() to forcefully wait until queue is empty.
-                        # It's not the default behavior (yet), since it
-                        # noticeably slows down the response time.
-                        analytics.track(**context.raw["segment"])
-                        # analytics.flush()
-                    except Exception as e:
-                        logger.exception("Error occurred during send for Segment.", exc_info=e)
+                track_segment_event(message["status"])
             await send(message)
 
         await self.app(scope, receive, send_wrapper)
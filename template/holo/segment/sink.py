@@ -0,0 +1,159 @@
+"""
+Uploads Segment events in batches from the event loop, instead of from the
+thread of the segment library.
+"""
+
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import aiohttp
+from prometheus_client import Counter, Gauge
+
+from holo.config import config
+from holo.workers import set_gauge_function
+
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_EVENTS_SENT = Counter("segment_events_sent_total", "Total count of events uploaded to Segment")
+SEGMENT_EVENTS_DROPPED = Counter(
+    "segment_events_dropped_total",
+    "Total count of events not uploaded to Segment",
+    ["reason"],
+)
+SEGMENT_QUEUE_SIZE = Gauge(
+    "segment_queue_size",
+    "Gauge of events waiting to be uploaded to Segment",
+    multiprocess_mode="liveall",
+)
+
+
+class SegmentSink:
+    """
+    Queues tracked events and uploads them in batches of SEGMENT_BATCH_SIZE
+    in the background. Events are dropped when SEGMENT_QUEUE_SIZE events are
+    already waiting, or when their upload fails.
+
+    Events are only queued when SEGMENT_WRITE_KEY is set.
+    """
+
+    def __init__(self) -> None:
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=config.segment.SEGMENT_QUEUE_SIZE)
+        # Events taken from the queue but not uploaded yet.
+        self._batch: list[dict] = []
+        self._task: asyncio.Task | None = None
+
+        set_gauge_function(SEGMENT_QUEUE_SIZE, self._queue.qsize)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(config.segment.SEGMENT_WRITE_KEY)
+
+    def track(
+        self,
+        user_id: str | None = None,
+        event: str | None = None,
+        properties: dict | None = None,
+        context: dict | None = None,
+        anonymous_id: str | None = None,
+        integrations: dict | None = None,
+    ) -> None:
+        """
+        Queue a track event, with the arguments of `analytics.track`.
+        """
+        if not event:
+            raise ValueError("event is required")
+        if not user_id and not anonymous_id:
+            raise ValueError("either user_id or anonymous_id is required")
+        if not self.enabled:
+            return
+
+        message = {
+            "type": "track",
+            "event": event,
+            "properties": properties or {},
+            "context": context or {},
+            "integrations": integrations or {},
+            "timestamp": datetime.now(UTC).isoformat(),
+            "messageId": str(uuid4()),
+        }
+        if user_id:
+            message["userId"] = user_id
+        if anonymous_id:
+            message["anonymousId"] = anonymous_id
+
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            SEGMENT_EVENTS_DROPPED.labels(reason="overflow").inc()
+
+    async def start(self) -> None:
+        """
+        Upload the queued events in the background.
+        """
+        if not self.enabled or self._task:
+            return
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop uploading in the background and upload the remaining events.
+        """
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Upload all queued events.
+        """
+        while self._batch or not self._queue.empty():
+            self._fill_batch()
+            await self._upload()
+
+    def _fill_batch(self) -> None:
+        with suppress(asyncio.QueueEmpty):
+            while len(self._batch) < config.segment.SEGMENT_BATCH_SIZE:
+                self._batch.append(self._queue.get_nowait())
+
+    async def _run(self) -> None:
+        while True:
+            if not self._batch:
+                self._batch.append(await self._queue.get())
+            if self._queue.qsize() < config.segment.SEGMENT_BATCH_SIZE - len(self._batch):
+                await asyncio.sleep(config.segment.SEGMENT_FLUSH_INTERVAL)
+            self._fill_batch()
+            await self._upload()
+
+    async def _upload(self) -> None:
+        """
+        Upload the current batch, it's kept when the upload is cancelled so
+        `stop` can still upload it. Segment deduplicates events by messageId.
+        """
+        batch_url = f"{config.segment.SEGMENT_HOST}/v1/batch"
+        try:
+            async with aiohttp.request(
+                "POST",
+                batch_url,
+                json={"batch": self._batch, "sentAt": datetime.now(UTC).isoformat()},
+                auth=aiohttp.BasicAuth(config.segment.SEGMENT_WRITE_KEY, ""),
+                timeout=aiohttp.ClientTimeout(total=10),
+            ) as response:
+                response.raise_for_status()
+        except Exception:
+            SEGMENT_EVENTS_DROPPED.labels(reason="upload").inc(len(self._batch))
+            logger.exception("Failed to upload %d events to %s", len(self._batch), batch_url)
+        else:
+            SEGMENT_EVENTS_SENT.inc(len(self._batch))
+        self._batch = []
+
+
+segment_sink = SegmentSink()
@@ -1,7 +1,18 @@
+import asyncio
 import hashlib
 import uuid
 
+import httpx
+import pytest
+from fastapi import FastAPI
 from starlette import status
+from yarl import URL
+
+from holo.config import config
+from holo.ctx import ASGIContextMiddleware, context
+from holo.ctx_test import ENCODED_USER_JWT
+from holo.segment.middleware import SegmentASGIMiddleware
+from holo.segment.sink import SEGMENT_EVENTS_DROPPED, SegmentSink
 
 
 async def test_segment_headers(test_client, mocker) -> None:
@@ -18,7 +29,7 @@ async def test_segment_headers(test_client, mocker) -> None:
         "X-SEGMENT-CONTEXT-A-B-C-D": "contextvar",
     }
 
-    mocked_track = mocker.patch("holo.segment.middleware.analytics.track")
+    mocked_track = mocker.patch("holo.segment.middleware.segment_sink.track")
 
     get_url = "/docs"
     response = await test_client.get(get_url, headers=headers)
@@ -37,3 +48,70 @@ async def test_segment_headers(test_client, mocker) -> None:
         },
     }
     mocked_track.assert_called_once_with(user_id=identity, event="my-important-event", context=context)
+
+
+async def test_segment_user_id(mocker) -> None:
+    """
+    Test the hashed JWT subject is the user id of the event before the view runs.
+    """
+    app = FastAPI()
+    app.add_middleware(SegmentASGIMiddleware)
+    app.add_middleware(ASGIContextMiddleware)
+
+    @app.get("/segment")
+    async def segment() -> dict:
+        return context.raw["segment"]
+
+    mocked_track = mocker.patch("holo.segment.middleware.segment_sink.track")
+    identity = hashlib.sha256(b"c6fa0410-1ba2-4ab0-a460-2369a248883b").hexdigest()
+    app_context = {"app": {"name": config.service.SERVICE_NAME}}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        headers = {"Authorization": f"Bearer {ENCODED_USER_JWT}"}
+        response = await client.get("/segment", headers=headers)
+        assert response.json() == {"context": app_context}
+
+        response = await client.get("/segment", headers={**headers, "X-Segment-Event": "viewed"})
+        assert response.json() == {"user_id": identity, "event": "viewed", "context": app_context}
+
+    mocked_track.assert_called_once_with(user_id=identity, event="viewed", context=app_context)
+
+
+@pytest.fixture
+def sink(mocker) -> SegmentSink:
+    mocker.patch.object(config.segment, "SEGMENT_WRITE_KEY", "write-key")
+    mocker.patch.object(config.segment, "SEGMENT_HOST", "http://segment.test")
+    mocker.patch.object(config.segment, "SEGMENT_BATCH_SIZE", 2)
+    return SegmentSink()
+
+
+async def test_sink_uploads_batches(sink, aioresponse) -> None:
+    """
+    Test queued events are uploaded in batches on flush.
+    """
+    aioresponse.post("http://segment.test/v1/batch")
+    aioresponse.post("http://segment.test/v1/batch")
+    for i in range(3):
+        sink.track(user_id="user", event=f"event-{i}")
+
+    await sink.flush()
+
+    requests = aioresponse.requests[("POST", URL("http://segment.test/v1/batch"))]
+    batches = [request.kwargs["json"]["batch"] for request in requests]
+    assert [[message["event"] for message in batch] for batch in batches] == [["event-0", "event-1"], ["event-2"]]
+    assert batches[0][0]["userId"] == "user"
+
+
+async def test_sink_drops_on_overflow(sink) -> None:
+    """
+    Test events are dropped when the queue is full.
+    """
+    sink._queue = asyncio.Queue(maxsize=1)
+    dropped = SEGMENT_EVENTS_DROPPED.labels(reason="overflow")
+    dropped_before = dropped._value.get()
+
+    sink.track(user_id="user", event="event-1")
+    sink.track(user_id="user", event="event-2")
+
+    assert sink._queue.qsize() == 1
+    assert dropped._value.get() == dropped_before + 1
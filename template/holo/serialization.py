@@ -0,0 +1,62 @@
+import json
+from decimal import Decimal
+from typing import Any, Protocol
+
+import orjson
+from pydantic import BaseModel
+
+from holo.utils import to_json_string
+
+
+class JSONCodec(Protocol):
+    """
+    Encodes and decodes JSON, including UUID, Decimal, date, datetime and
+    pydantic models.
+    """
+
+    def dumps(self, obj: Any) -> bytes: ...
+
+    def loads(self, data: bytes | str) -> Any: ...
+
+
+class StdlibJSONCodec:
+    """
+    JSON codec using the `json` module from the standard library.
+    """
+
+    @staticmethod
+    def _default(obj: Any) -> Any:
+        if isinstance(obj, BaseModel):
+            return obj.model_dump(mode="json")
+        return to_json_string(obj)
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, default=self._default).encode()
+
+    def loads(self, data: bytes | str) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """
+    JSON codec using orjson, which encodes UUID, date and datetime natively.
+    Output is compact and non-string keys are allowed, like with `json`.
+    """
+
+    @staticmethod
+    def _default(obj: Any) -> Any:
+        if isinstance(obj, BaseModel):
+            return obj.model_dump(mode="json")
+        if isinstance(obj, Decimal):
+            return str(obj)
+        raise TypeError(f"Unable to serialize type {type(obj)}.")
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=self._default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: bytes | str) -> Any:
+        return orjson.loads(data)
+
+
+# The codec used by holo, replace it to use another implementation.
+codec: JSONCodec = OrjsonCodec()
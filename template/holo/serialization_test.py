@@ -0,0 +1,51 @@
+from datetime import UTC, date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+from pydantic import BaseModel
+
+from holo.serialization import OrjsonCodec, StdlibJSONCodec
+
+
+class SomeModel(BaseModel):
+    id: UUID
+    time: datetime
+
+
+@pytest.mark.parametrize("codec", [StdlibJSONCodec(), OrjsonCodec()])
+def test_codec(codec) -> None:
+    """
+    Test codecs encode the types holo uses in the same way.
+    """
+    some_id = UUID("9b4a3b4c-3f5e-4b8e-9c1c-6f1e0b1d2a3f")
+    some_time = datetime(2024, 1, 2, 3, 4, 5, 6, tzinfo=UTC)
+
+    encoded = codec.dumps(
+        {
+            "id": some_id,
+            "price": Decimal("1.10"),
+            "day": date(2024, 1, 2),
+            "time": some_time,
+            "model": SomeModel(id=some_id, time=some_time),
+            1: "non-string key",
+        },
+    )
+
+    assert codec.loads(encoded) == {
+        "id": "9b4a3b4c-3f5e-4b8e-9c1c-6f1e0b1d2a3f",
+        "price": "1.10",
+        "day": "2024-01-02",
+        "time": "2024-01-02T03:04:05.000006+00:00",
+        "model": {"id": "9b4a3b4c-3f5e-4b8e-9c1c-6f1e0b1d2a3f", "time": "2024-01-02T03:04:05.000006Z"},
+        "1": "non-string key",
+    }
+
+
+@pytest.mark.parametrize("codec", [StdlibJSONCodec(), OrjsonCodec()])
+def test_codec_unknown_type(codec) -> None:
+    """
+    Test codecs refuse types they don't know.
+    """
+    with pytest.raises(TypeError):
+        codec.dumps({"some": object()})
@@ -0,0 +1,180 @@
+"""
+Support for serving with multiple worker processes, see scripts/serve.py.
+
+The worker processes share a directory, set in PROMETHEUS_MULTIPROC_DIR, in
+which the Prometheus client writes the metrics of each worker and the workers
+claim their slots.
+"""
+
+import asyncio
+import fcntl
+import glob
+import logging
+import os
+import tempfile
+from collections.abc import Callable
+from contextlib import suppress
+from typing import IO
+
+from prometheus_client import REGISTRY, CollectorRegistry, Gauge, multiprocess
+
+from holo.config import config
+
+
+logger = logging.getLogger(__name__)
+
+MULTIPROCESS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Seconds between setting the gauges of `set_gauge_function` with multiple workers.
+GAUGE_REFRESH_INTERVAL = 5
+
+
+def worker_count() -> int:
+    """
+    Number of HTTP worker processes to serve with.
+    """
+    return config.service.WORKERS or os.cpu_count() or 1
+
+
+def is_multiprocess() -> bool:
+    return bool(os.environ.get(MULTIPROCESS_DIR_ENV))
+
+
+def prepare_multiprocess_dir() -> str:
+    """
+    Set up an empty directory shared by the workers, call it before the
+    workers are started so they inherit it.
+    """
+    if directory := os.environ.get(MULTIPROCESS_DIR_ENV):
+        # Metrics of previous runs would be reported as metrics of this run,
+        # only those are removed as the directory isn't necessarily ours.
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+    else:
+        directory = os.environ[MULTIPROCESS_DIR_ENV] = tempfile.mkdtemp(prefix="prometheus-")
+    return directory
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Registry with the metrics of all workers when serving with multiple
+    workers, otherwise the default registry.
+    """
+    if not is_multiprocess():
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def set_gauge_function(gauge: Gauge, func: Callable[[], float]) -> None:
+    """
+    Like `gauge.set_function(func)`, also with multiple workers. Only the set
+    values of gauges are collected from the workers then, so `gauge_refresher`
+    sets `gauge` to the result of `func` every GAUGE_REFRESH_INTERVAL seconds.
+    """
+    if is_multiprocess():
+        gauge_refresher.functions[gauge] = func
+    else:
+        gauge.set_function(func)
+
+
+class GaugeRefresher:
+    """
+    Sets the gauges of `set_gauge_function` in the background when serving
+    with multiple workers.
+    """
+
+    def __init__(self) -> None:
+        self.functions: dict[Gauge, Callable[[], float]] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return is_multiprocess()
+
+    async def start(self) -> None:
+        if not self.enabled or self._task:
+            return
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def refresh(self) -> None:
+        for gauge, func in list(self.functions.items()):
+            try:
+                gauge.set(func())
+            except Exception:
+                logger.exception("Failed to refresh a gauge")
+
+    async def _run(self) -> None:
+        while True:
+            self.refresh()
+            await asyncio.sleep(GAUGE_REFRESH_INTERVAL)
+
+
+def mark_process_dead() -> None:
+    """
+    Drop the live gauges of this worker from the metrics, call it when the
+    worker stops.
+    """
+    if is_multiprocess():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class WorkerSlot:
+    """
+    One of `slots` slots named `name` shared by the workers, a worker holds
+    its slot until it releases it or exits. A worker replacing one that
+    exited can claim the slot again. Without multiple workers, the only
+    worker always gets a slot.
+    """
+
+    def __init__(self, name: str, slots: int, directory: str | None = None) -> None:
+        self.name = name
+        self.slots = slots
+        self.directory = directory
+        self.index: int | None = None
+        self._file: IO | None = None
+
+    def acquire(self) -> bool:
+        """
+        Claim a free slot, returns whether one was free.
+        """
+        directory = self.directory or os.environ.get(MULTIPROCESS_DIR_ENV)
+        if not directory:
+            self.index = 0
+            return True
+        if self._file:
+            return True
+
+        for index in range(self.slots):
+            # The file stays open while the slot is held, its lock is the slot.
+            file = open(os.path.join(directory, f"{self.name}-{index}.lock"), "w")  # noqa: SIM115
+            try:
+                # The lock is released by the OS when the worker exits.
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                file.close()
+            else:
+                self.index = index
+                self._file = file
+                return True
+        return False
+
+    def release(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+        self.index = None
+
+
+gauge_refresher = GaugeRefresher()
@@ -0,0 +1,42 @@
+from holo.workers import WorkerSlot, prepare_multiprocess_dir
+
+
+def test_worker_slots(tmp_path) -> None:
+    """
+    Test workers claim distinct slots, and released slots can be claimed again.
+    """
+    first = WorkerSlot("nats", 2, directory=str(tmp_path))
+    second = WorkerSlot("nats", 2, directory=str(tmp_path))
+    third = WorkerSlot("nats", 2, directory=str(tmp_path))
+
+    assert first.acquire()
+    assert second.acquire()
+    assert not third.acquire()
+    assert {first.index, second.index} == {0, 1}
+
+    first.release()
+
+    assert third.acquire()
+    assert third.index == 0
+
+
+def test_worker_slot_single_worker(monkeypatch) -> None:
+    """
+    Test the only worker always gets a slot.
+    """
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+
+    assert WorkerSlot("nats", 1).acquire()
+    assert WorkerSlot("nats", 1).acquire()
+
+
+def test_prepare_multiprocess_dir(monkeypatch, tmp_path) -> None:
+    """
+    Test only the metrics of previous runs are removed from an existing directory.
+    """
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    (tmp_path / "gauge_all_1.db").write_bytes(b"")
+    (tmp_path / "other.txt").write_text("keep")
+
+    assert prepare_multiprocess_dir() == str(tmp_path)
+    assert [path.name for path in tmp_path.iterdir()] == ["other.txt"]
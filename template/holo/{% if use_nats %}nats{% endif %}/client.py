@@ -2,6 +2,7 @@ import asyncio
 import logging
 from collections.abc import Callable, Iterable
 from datetime import UTC, datetime
+from enum import StrEnum, auto
 from time import perf_counter
 from typing import Annotated, Any, Union
 
@@ -19,6 +20,17 @@ from holo.nats.metrics import EVENT_NAKS, EVENTS_WAITING, EVENTS_WAITING_TIME, E
 logger = logging.getLogger(__name__)
 
 
+class ConnectionRole(StrEnum):
+    """
+    Roles of the connections managed by `NatsConnector`, each role uses its
+    own connection(s) so traffic of one role can't delay another.
+    """
+
+    CONSUME = auto()  # JetStream pull consumers and plain subscribers.
+    PUBLISH = auto()  # Publishing events and acking consumed messages.
+    RESGATE = auto()  # Resgate requests, responses and events.
+
+
 class HoloNatsConcurrentSubscribeMixin:
     # This set is used to gather async background tasks, to prevent them being garbage collected mid execution.
     # See: https://docs.python.org/3/library/asyncio-task.html#asyncio.create_task
@@ -57,12 +69,13 @@ class HoloNatsConcurrentSubscribeMixin:
                 "eventtype": subject_parts[1],
                 "version": subject_parts[2],
             }
-            EVENTS_WAITING.labels(**labels)
-            EVENTS_WAITING_TIMEOUTS.labels(**labels)
-            EVENTS_WAITING_TIME.labels(**labels)
+            # Resolve the labels once instead of for every message.
+            events_waiting = EVENTS_WAITING.labels(**labels)
+            events_waiting_timeouts = EVENTS_WAITING_TIMEOUTS.labels(**labels)
+            events_waiting_time = EVENTS_WAITING_TIME.labels(**labels)
 
             async def callback_release_lock(msg):
-                EVENTS_WAITING.labels(**labels).dec()
+                events_waiting.dec()
                 try:
                     await original_callback(msg)
                 finally:
@@ -70,7 +83,7 @@ class HoloNatsConcurrentSubscribeMixin:
                         self.background_task_info[msg.subject]["active"] -= 1
 
             async def callback_acquire_lock(msg):
-                EVENTS_WAITING.labels(**labels).inc()
+                events_waiting.inc()
                 try:
                     async with asyncio.timeout(ack_wait):
                         before_time = perf_counter()
@@ -82,13 +95,13 @@ class HoloNatsConcurrentSubscribeMixin:
                                 ):
                                     self.background_task_info[msg.subject]["active"] += 1
                                     after_time = perf_counter()
-                                    EVENTS_WAITING_TIME.labels(**labels).observe(after_time - before_time)
+                                    events_waiting_time.observe(after_time - before_time)
                                     break
                                 else:
                                     await asyncio.sleep(0.001)
                 except TimeoutError:
-                    EVENTS_WAITING_TIMEOUTS.labels(**labels).inc()
-                    EVENTS_WAITING.labels(**labels).dec()
+                    events_waiting_timeouts.inc()
+                    events_waiting.dec()
                 else:
                     task = asyncio.create_task(callback_release_lock(msg))
 
@@ -135,10 +148,13 @@ class NatsSubscription:
         else:
             self.models = (models,)
 
+        # Building the adapter is expensive, reuse it for all messages.
+        self.adapter: TypeAdapter = TypeAdapter(Annotated[Union[*self.models], Field(discriminator="name")])
+
     async def on_message(self, msg: Msg) -> None:
         try:
-            Model = Annotated[Union[*self.models], Field(discriminator="name")]
-            model = TypeAdapter(Model).validate_json(msg.data.decode())
+            # Pydantic parses the bytes itself, without decoding them first.
+            model = self.adapter.validate_json(msg.data)
 
             # Check if the model is a container consisting of multiple schemas. If so, the schema that the model is
             # valid for will be located in __root__. Use that specific schema instead of the container schema.
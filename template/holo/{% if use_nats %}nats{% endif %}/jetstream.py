@@ -4,27 +4,89 @@ import logging
 import re
 from collections import deque
 from collections.abc import Callable, Coroutine
+from dataclasses import replace
 from time import perf_counter
 from typing import Any
 
-from nats.errors import ConnectionClosedError
+from nats.aio.msg import Msg
+from nats.errors import ConnectionClosedError, Error, MsgAlreadyAckdError, NotJSMessageError
 from nats.js import JetStreamContext
-from nats.js.api import ConsumerConfig, PubAck, StreamConfig
+from nats.js.api import ConsumerConfig, ConsumerInfo, PubAck, StreamConfig
 from nats.js.errors import NotFoundError
+from prometheus_client import Counter, Gauge, Histogram
+from pydantic import BaseModel
 
+from holo import serialization
 from holo.adapters.nats.events import BaseEvent
 from holo.config import config
 from holo.nats.client import HoloNats, NatsSubscription
 from holo.nats.metrics import EVENTS_WAITING, EVENTS_WAITING_TIME, EVENTS_WAITING_TIMEOUTS
+from holo.nats.protocol import SubscriberStartup
 
 
 logger = logging.getLogger(__name__)
 
 
+class AckConnectionMsg:
+    """
+    A pulled message acked over `connection` instead of the connection it was
+    pulled on, other attributes are those of the message.
+    """
+
+    def __init__(self, msg: Msg, connection: HoloNats) -> None:
+        self.msg = msg
+        self.connection = connection
+        self.acked = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.msg, name)
+
+    @property
+    def is_acked(self) -> bool:
+        return self.acked or self.msg.is_acked
+
+    async def ack(self) -> None:
+        await self._reply(Msg.Ack.Ack)
+
+    async def nak(self, delay: float | None = None) -> None:
+        payload = Msg.Ack.Nak
+        if delay:
+            payload += b" " + serialization.codec.dumps({"delay": int(delay * 10**9)})
+        await self._reply(payload)
+
+    async def in_progress(self) -> None:
+        await self._reply(Msg.Ack.Progress, final=False)
+
+    async def term(self) -> None:
+        await self._reply(Msg.Ack.Term)
+
+    async def ack_sync(self, timeout: float = 1.0) -> Msg:
+        """
+        Ack and wait for the server to confirm it.
+        """
+        self._check_reply(final=True)
+        response = await self.connection.request(self.msg.reply, timeout=timeout)
+        self.acked = True
+        return response
+
+    async def _reply(self, payload: bytes, final: bool = True) -> None:
+        self._check_reply(final)
+        await self.connection.publish(self.msg.reply, payload)
+        if final:
+            self.acked = True
+
+    def _check_reply(self, final: bool) -> None:
+        if not self.msg.reply:
+            raise NotJSMessageError
+        if final and self.is_acked:
+            raise MsgAlreadyAckdError(self.msg)
+
+
 class NatsStreamSubscriber:
     def __init__(self, name: str) -> None:
         self.stream_name: str = name
         self.js: JetStreamContext
+        self.publish_js: JetStreamContext
 
         self.subscribers: list[NatsPullSubscriber] = []
 
@@ -54,36 +116,103 @@ class NatsStreamSubscriber:
 
         return add_subscription
 
-    async def publish(self, subject: str, payload: bytes = b"") -> PubAck:
-        return await self.js.publish(subject=f"{self.stream_name}.{subject}", payload=payload)
+    async def publish(self, subject: str, payload: bytes | BaseModel | dict = b"") -> PubAck:
+        """
+        Publish `payload`, events and dicts are encoded to JSON.
+        """
+        if not isinstance(payload, bytes):
+            payload = serialization.codec.dumps(payload)
+        return await self.publish_js.publish(subject=f"{self.stream_name}.{subject}", payload=payload)
 
-    async def connect(self, con: HoloNats, consumer_name: str) -> None:
+    @staticmethod
+    def _jetstream(con: HoloNats) -> JetStreamContext:
         js_opts = {}
         if config.service.ENVIRONMENT and not config.service.TESTING:
             js_opts["domain"] = "voipgrid"
-        self.js = con.jetstream(**js_opts)
+        return con.jetstream(**js_opts)
 
-        # Create the stream if it doesn't exist yet.
-        try:
-            await self.js.stream_info(self.stream_name)
-        except NotFoundError:
-            await self.js.add_stream(
-                name=self.stream_name,
-                subjects=[f"{self.stream_name}.>"],
-                config=StreamConfig(num_replicas=3),
+    async def connect(
+        self,
+        con: HoloNats,
+        consumer_name: str,
+        publish_con: HoloNats | None = None,
+        startup: SubscriberStartup | None = None,
+    ) -> None:
+        """
+        Set up the stream and connect the pull subscribers concurrently,
+        bounded by the semaphore of `startup`, which is shared with the other
+        subscribers connecting at the same time.
+        """
+        self.js = self._jetstream(con)
+        # Publishes and acks go over `publish_con` when given, so they aren't
+        # queued behind the messages fetched over `con`.
+        self.publish_js = self._jetstream(publish_con or con)
+
+        if startup is None:
+            startup = SubscriberStartup(asyncio.Semaphore(config.nats.NATS_STARTUP_CONCURRENCY))
+        if not (setup_task := startup.stream_setups.get(self.stream_name)):
+            setup_task = startup.stream_setups[self.stream_name] = asyncio.create_task(
+                self._setup_stream(startup.semaphore),
             )
+        consumers = await setup_task
+
+        async def connect_subscriber(subscriber: NatsPullSubscriber) -> None:
+            async with startup.semaphore:
+                await subscriber.connect(
+                    self.stream_name,
+                    consumer_name,
+                    self.js,
+                    ack_connection=publish_con or con,
+                    consumers=consumers,
+                )
+
+        await asyncio.gather(*(connect_subscriber(subscriber) for subscriber in self.subscribers))
+
+    async def _setup_stream(self, semaphore: asyncio.Semaphore) -> dict[str, ConsumerInfo]:
+        """
+        Create the stream if it doesn't exist yet and return its existing
+        consumers by name, in a single request when the stream exists.
+        """
+        async with semaphore:
+            try:
+                consumers = await self.js._jsm.consumers_info(self.stream_name)
+            except NotFoundError:
+                await self.js.add_stream(
+                    name=self.stream_name,
+                    subjects=[f"{self.stream_name}.>"],
+                    config=StreamConfig(num_replicas=3),
+                )
+                consumers = []
+
+        return {consumer.name: consumer for consumer in consumers}
+
+    async def reconnect(self, con: HoloNats, publish_con: HoloNats | None = None) -> None:
+        """
+        Move the existing pull subscribers to new connections, the stream and
+        consumers already exist so they are only bound again.
+        """
+        self.js = self._jetstream(con)
+        self.publish_js = self._jetstream(publish_con or con)
 
         for subscriber in self.subscribers:
-            await subscriber.connect(
-                self.stream_name,
-                consumer_name,
-                self.js,
-            )
+            await subscriber.reconnect(self.js, ack_connection=publish_con or con)
 
     async def start(self) -> None:
         for subscriber in self.subscribers:
             await subscriber.start()
 
+    async def check(self) -> None:
+        """
+        Check the consumers of the pull subscribers exist on the server and
+        are still pulled from.
+        """
+        consumers = {consumer.name for consumer in await self.js._jsm.consumers_info(self.stream_name)}
+        for subscriber in self.subscribers:
+            if subscriber.durable not in consumers:
+                raise Error(f"Jetstream consumer {subscriber.durable} does not exist")
+            if subscriber.running and (not subscriber.pull_task or subscriber.pull_task.done()):
+                raise Error(f"Jetstream consumer {subscriber.durable} is not pulled from")
+
     async def disconnect(self) -> None:
         tasks = set()
         for subscriber in self.subscribers:
@@ -106,10 +235,15 @@ class NatsPullSubscriber:
 
     message_queue: asyncio.Queue
     pull_event: asyncio.Event
+    pull_task: asyncio.Task | None = None
 
     task_lock: asyncio.Lock
     notify_lock: asyncio.Condition
 
+    events_waiting: Gauge
+    events_waiting_timeouts: Counter
+    events_waiting_time: Histogram
+
     def __init__(self, subscription: NatsSubscription) -> None:
         self.subscription = subscription
 
@@ -118,7 +252,14 @@ class NatsPullSubscriber:
         stream_name: str,
         consumer_name: str,
         stream: JetStreamContext,
+        ack_connection: HoloNats | None = None,
+        consumers: dict[str, ConsumerInfo] | None = None,
     ) -> None:
+        """
+        Bind to the durable consumer of this subscription, creating it when
+        it's not in `consumers` (the stream's consumers by name) or on the
+        server.
+        """
         self.tasks = set()
 
         self.running = False
@@ -135,9 +276,10 @@ class NatsPullSubscriber:
         self.stream_name = stream_name
         self.consumer_name = consumer_name
         self.js = stream
+        self.ack_connection = ack_connection
 
         name = re.sub("[*>]", "", self.subscription.subject.replace(".", "-"))
-        queue = self.subscription.queue or f"{self.consumer_name}-{self.stream_name}-{name}"
+        self.durable = self.subscription.queue or f"{self.consumer_name}-{self.stream_name}-{name}"
 
         # The `subject` argument is the full topic, eg. "SIP.account.changed.v1".
         self.subject = f"{self.stream_name}.{self.subscription.subject}"
@@ -147,21 +289,52 @@ class NatsPullSubscriber:
             "eventtype": subject_parts[1],
             "version": subject_parts[2],
         }
-        EVENTS_WAITING.labels(**self.labels)
-        EVENTS_WAITING_TIMEOUTS.labels(**self.labels)
-        EVENTS_WAITING_TIME.labels(**self.labels)
+        # Resolve the labels once instead of for every message.
+        self.events_waiting = EVENTS_WAITING.labels(**self.labels)
+        self.events_waiting_timeouts = EVENTS_WAITING_TIMEOUTS.labels(**self.labels)
+        self.events_waiting_time = EVENTS_WAITING_TIME.labels(**self.labels)
 
         logger.info("Jetstream listening on %s", self.subject)
-        logger.info("Using queue: %s", queue)
+        logger.info("Using queue: %s", self.durable)
 
-        self.psub = await self.js.pull_subscribe(
-            subject=self.subject,
-            durable=queue,
-            stream=self.stream_name,
-            config=self.subscription.config,
-        )
+        consumer_info = (consumers or {}).get(self.durable) or await self._get_or_add_consumer()
+        self.subscription.config = consumer_info.config
 
-        self.subscription.config = (await self.js._jsm.consumer_info(self.stream_name, queue)).config
+        self.psub = await self.js.pull_subscribe_bind(durable=self.durable, stream=self.stream_name)
+
+    async def _get_or_add_consumer(self) -> ConsumerInfo:
+        """
+        Same as what `pull_subscribe` does, but without asking for the
+        consumer info twice.
+        """
+        try:
+            return await self.js._jsm.consumer_info(self.stream_name, self.durable)
+        except NotFoundError:
+            consumer_config = replace(
+                self.subscription.config or ConsumerConfig(),
+                durable_name=self.durable,
+                filter_subject=self.subject,
+            )
+            return await self.js._jsm.add_consumer(self.stream_name, config=consumer_config)
+
+    async def reconnect(self, stream: JetStreamContext, ack_connection: HoloNats | None = None) -> None:
+        """
+        Bind to the existing consumer over a new connection and restart
+        pulling. Queued messages and running handlers are kept, queued
+        messages are acked over `ack_connection` once they are processed.
+        """
+        self.js = stream
+        self.ack_connection = ack_connection
+
+        logger.info("Jetstream rebinding %s", self.subject)
+        self.psub = await self.js.pull_subscribe_bind(durable=self.durable, stream=self.stream_name)
+
+        if self.running:
+            # The pull task is the one triggering the reconnect most of the
+            # time, that one stops by itself after the reconnect.
+            if self.pull_task and self.pull_task is not asyncio.current_task():
+                self.pull_task.cancel()
+            self._start_pull_task()
 
     async def start(self) -> None:
         self.running = True
@@ -170,9 +343,12 @@ class NatsPullSubscriber:
         self.tasks.add(reconnecting_process_task)
         reconnecting_process_task.add_done_callback(self.tasks.discard)
 
-        reconnecting_pull_task = asyncio.create_task(self._reconnect(self.pull_messages, self.psub))
-        self.tasks.add(reconnecting_pull_task)
-        reconnecting_pull_task.add_done_callback(self.tasks.discard)
+        self._start_pull_task()
+
+    def _start_pull_task(self) -> None:
+        self.pull_task = asyncio.create_task(self._reconnect(self.pull_messages, self.psub))
+        self.tasks.add(self.pull_task)
+        self.pull_task.add_done_callback(self.tasks.discard)
 
     async def disconnect(self) -> None:
         self.running = False
@@ -272,7 +448,7 @@ class NatsPullSubscriber:
                 elif len(fetch_history) >= 10:
                     self.batch = max(self.batch - 10, min_batch)
 
-                EVENTS_WAITING.labels(**self.labels).inc(len(msgs))
+                self.events_waiting.inc(len(msgs))
 
                 # Keep track of when these messages were pulled to have them
                 # timeout when their ack_time has been exceeded.
@@ -306,12 +482,17 @@ class NatsPullSubscriber:
                         self.active_tasks += 1
 
                 after_time = perf_counter()
-                EVENTS_WAITING_TIME.labels(**self.labels).observe(after_time - pull_time)
+                self.events_waiting_time.observe(after_time - pull_time)
             except TimeoutError:
-                EVENTS_WAITING_TIMEOUTS.labels(**self.labels).inc()
-                EVENTS_WAITING.labels(**self.labels).dec()
+                self.events_waiting_timeouts.inc()
+                self.events_waiting.dec()
             else:
-                EVENTS_WAITING.labels(**self.labels).dec()
+                self.events_waiting.dec()
+
+                if self.ack_connection:
+                    # Ack (and nak) over the current publish connection, this
+                    # might not be the connection the message was pulled on.
+                    msg = AckConnectionMsg(msg, self.ack_connection)
 
                 task = asyncio.create_task(self.subscription.on_message(msg))
                 task.add_done_callback(self.tasks.discard)
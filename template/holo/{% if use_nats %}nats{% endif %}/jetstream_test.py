@@ -0,0 +1,33 @@
+import pytest
+from nats.aio.msg import Msg
+from nats.errors import MsgAlreadyAckdError
+
+from holo.nats.jetstream import AckConnectionMsg
+
+
+async def test_ack_connection_msg(mocker) -> None:
+    """
+    Test a wrapped message is acked over the ack connection, not the one it was pulled on.
+    """
+    pull_connection = mocker.AsyncMock()
+    ack_connection = mocker.AsyncMock()
+    msg = AckConnectionMsg(Msg(_client=pull_connection, subject="STREAM.a", reply="$JS.ACK.1"), ack_connection)
+
+    await msg.in_progress()
+    await msg.nak(delay=1.5)
+
+    assert msg.subject == "STREAM.a"
+    assert msg.is_acked
+    assert ack_connection.publish.call_args_list == [
+        mocker.call("$JS.ACK.1", Msg.Ack.Progress),
+        mocker.call("$JS.ACK.1", b'-NAK {"delay":1500000000}'),
+    ]
+    with pytest.raises(MsgAlreadyAckdError):
+        await msg.ack()
+
+    msg = AckConnectionMsg(Msg(_client=pull_connection, subject="STREAM.a", reply="$JS.ACK.2"), ack_connection)
+    await msg.ack_sync()
+
+    assert msg.is_acked
+    ack_connection.request.assert_awaited_once_with("$JS.ACK.2", timeout=1.0)
+    assert not pull_connection.method_calls
@@ -89,6 +89,43 @@ EVENTS_WAITING = Gauge(
 )
 
 
+CONNECTION_IN_BYTES = Gauge(
+    "nats_connection_in_bytes",
+    "Total bytes received by NATS connection",
+    ["role", "index"],
+    multiprocess_mode="liveall",
+)
+CONNECTION_OUT_BYTES = Gauge(
+    "nats_connection_out_bytes",
+    "Total bytes sent by NATS connection",
+    ["role", "index"],
+    multiprocess_mode="liveall",
+)
+CONNECTION_PENDING_BYTES = Gauge(
+    "nats_connection_pending_bytes",
+    "Gauge of bytes buffered to be sent by NATS connection",
+    ["role", "index"],
+    multiprocess_mode="liveall",
+)
+CONNECTION_PENDING_MESSAGES = Gauge(
+    "nats_connection_pending_messages",
+    "Gauge of received messages waiting to be handled by the subscriptions of a NATS connection",
+    ["role", "index"],
+    multiprocess_mode="liveall",
+)
+
+RECONNECT_TIME = Histogram(
+    "nats_reconnect_time_seconds",
+    "Histogram of time spent replacing closed NATS connections and rebinding their subscribers (in seconds)",
+)
+
+STARTUP_TIME = Gauge(
+    "nats_startup_time_seconds",
+    "Gauge of time spent per phase of the last NATS startup (in seconds)",
+    ["phase"],
+)
+
+
 def instrument(
     subject: str,
     eventtype: str,
@@ -120,16 +157,17 @@ def instrument(
         coroutine: function wrapper which will count the number of events as well as time the
             amount of time it takes to process an event.
     """
-    # Initialize the labels.
-    EVENTS.labels(subject=subject, eventtype=eventtype, version=version)
-    EVENTS_DELAY.labels(subject=subject, eventtype=eventtype, version=version)
-    EVENTS_PROCESSING_TIME.labels(subject=subject, eventtype=eventtype, version=version)
-    EXCEPTIONS.labels(subject=subject, eventtype=eventtype, version=version)
-    EVENTS_ACK_TIMEOUTS.labels(subject=subject, eventtype=eventtype, version=version)
-    EVENTS_IN_PROGRESS.labels(subject=subject, eventtype=eventtype, version=version)
-    EVENT_NAKS.labels(subject=subject, eventtype=eventtype, version=version)
-    EVENTS_WAITING_TIMEOUTS.labels(subject=subject, eventtype=eventtype, version=version)
-    EVENTS_WAITING.labels(subject=subject, eventtype=eventtype, version=version)
+    # Initialize the labels, and resolve them once instead of for every event.
+    labels = {"subject": subject, "eventtype": eventtype, "version": version}
+    events = EVENTS.labels(**labels)
+    events_delay = EVENTS_DELAY.labels(**labels)
+    events_processing_time = EVENTS_PROCESSING_TIME.labels(**labels)
+    exceptions = EXCEPTIONS.labels(**labels)
+    events_ack_timeouts = EVENTS_ACK_TIMEOUTS.labels(**labels)
+    events_in_progress = EVENTS_IN_PROGRESS.labels(**labels)
+    EVENT_NAKS.labels(**labels)
+    EVENTS_WAITING_TIMEOUTS.labels(**labels)
+    EVENTS_WAITING.labels(**labels)
 
     def inner(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
         if not inspect.iscoroutinefunction(func):
@@ -137,12 +175,10 @@ def instrument(
 
         @wraps(func)
         async def wrapper(event, *args, **kwargs) -> Awaitable:
-            EVENTS_IN_PROGRESS.labels(subject=subject, eventtype=eventtype, version=version).inc()
-            EVENTS.labels(subject=subject, eventtype=eventtype, version=version).inc()
+            events_in_progress.inc()
+            events.inc()
             if hasattr(event, "time"):
-                EVENTS_DELAY.labels(subject=subject, eventtype=eventtype, version=version).set(
-                    float(event.time.timestamp()),
-                )
+                events_delay.set(float(event.time.timestamp()))
             before_time = perf_counter()
             try:
                 ret = await func(event, *args, **kwargs)
@@ -151,18 +187,16 @@ def instrument(
                 # EVENT_NAKS will be incremented.
                 raise
             except BaseException:
-                EXCEPTIONS.labels(subject=subject, eventtype=eventtype, version=version).inc()
+                exceptions.inc()
                 raise
             else:
-                after_time = perf_counter()
-                EVENTS_PROCESSING_TIME.labels(subject=subject, eventtype=eventtype, version=version).observe(
-                    after_time - before_time,
-                )
-                if after_time - before_time > ack_wait:
-                    EVENTS_ACK_TIMEOUTS.labels(subject=subject, eventtype=eventtype, version=version).inc()
+                duration = perf_counter() - before_time
+                events_processing_time.observe(duration)
+                if duration > ack_wait:
+                    events_ack_timeouts.inc()
                 return ret
             finally:
-                EVENTS_IN_PROGRESS.labels(subject=subject, eventtype=eventtype, version=version).dec()
+                events_in_progress.dec()
 
         return wrapper
 
@@ -1,3 +1,4 @@
+import contextlib
 import logging
 from io import BufferedIOBase
 
@@ -7,6 +8,7 @@ from nats.js.object_store import ObjectStore
 
 from holo.config import config
 from holo.nats.client import HoloNats
+from holo.nats.protocol import SubscriberStartup
 
 
 logger = logging.getLogger(__name__)
@@ -21,21 +23,34 @@ class NatsObjectStore:
         self.bucket: str = bucket
         self.object_store: ObjectStore
 
-    async def connect(self, con: HoloNats, consumer_name: str) -> None:
+    async def connect(
+        self,
+        con: HoloNats,
+        consumer_name: str,
+        publish_con: HoloNats | None = None,
+        startup: SubscriberStartup | None = None,
+    ) -> None:
         js_opts = {}
         if config.service.ENVIRONMENT and not config.service.TESTING:
             js_opts["domain"] = "voipgrid"
         js = con.jetstream(**js_opts)
 
         logger.info("Setting up object store %s.", self.bucket)
-        # Create the object store if it doesn't exist yet.
-        try:
-            self.object_store = await js.object_store(self.bucket)
-        except BucketNotFoundError:
-            self.object_store = await js.create_object_store(
-                bucket=self.bucket,
-                config=ObjectStoreConfig(replicas=3),
-            )
+        async with startup.semaphore if startup else contextlib.nullcontext():
+            # Create the object store if it doesn't exist yet.
+            try:
+                self.object_store = await js.object_store(self.bucket)
+            except BucketNotFoundError:
+                self.object_store = await js.create_object_store(
+                    bucket=self.bucket,
+                    config=ObjectStoreConfig(replicas=3),
+                )
+
+    async def reconnect(self, con: HoloNats, publish_con: HoloNats | None = None) -> None:
+        """
+        Look up the object store again over a new connection.
+        """
+        await self.connect(con, "", publish_con)
 
     async def start(self) -> None:
         """
@@ -49,6 +64,12 @@ class NatsObjectStore:
         stream subcribers.
         """
 
+    async def check(self) -> None:
+        """
+        Not used by the object store but this class needs to conform to the interface defined by the plain NATS and
+        stream subcribers.
+        """
+
     async def get(self, name: str, writeinto: BufferedIOBase) -> None:
         """
         Retrieve a file from the NATS object store and write its bytes to writeinto.
@@ -2,8 +2,12 @@ import logging
 from collections.abc import Callable
 from typing import ParamSpec, TypeVar
 
+from pydantic import BaseModel
+
+from holo import serialization
 from holo.adapters.nats.events import BaseEvent
 from holo.nats.client import HoloNats, NatsSubscription
+from holo.nats.protocol import SubscriberStartup
 
 
 T = TypeVar("T")
@@ -17,6 +21,8 @@ class NatsSubscriber:
     def __init__(self) -> None:
         self.subscriptions: list[NatsSubscription] = []
         self.connection: HoloNats
+        self.publish_connection: HoloNats
+        self.running = False
 
     def subscribe(
         self,
@@ -32,14 +38,37 @@ class NatsSubscriber:
 
         return add_subscription
 
-    async def publish(self, subject: str, payload: bytes = b"") -> None:
-        await self.connection.publish(subject=subject, payload=payload)
+    async def publish(self, subject: str, payload: bytes | BaseModel | dict = b"") -> None:
+        """
+        Publish `payload`, events and dicts are encoded to JSON.
+        """
+        if not isinstance(payload, bytes):
+            payload = serialization.codec.dumps(payload)
+        await self.publish_connection.publish(subject=subject, payload=payload)
 
-    async def connect(self, con: HoloNats, consumer_name: str) -> None:
+    async def connect(
+        self,
+        con: HoloNats,
+        consumer_name: str,
+        publish_con: HoloNats | None = None,
+        startup: SubscriberStartup | None = None,
+    ) -> None:
+        # Nothing to request from the server before starting.
         self.connection = con
+        self.publish_connection = publish_con or con
         self.consumer_name = consumer_name
 
+    async def reconnect(self, con: HoloNats, publish_con: HoloNats | None = None) -> None:
+        """
+        Subscribe again over a new connection, when started.
+        """
+        self.connection = con
+        self.publish_connection = publish_con or con
+        if self.running:
+            await self.start()
+
     async def start(self) -> None:
+        self.running = True
         for subscription in self.subscriptions:
             queue = subscription.queue or f"{self.consumer_name}-{subscription.subject}"
             logger.info("Adding NATS listener for %s", subscription.subject)
@@ -54,3 +83,7 @@ class NatsSubscriber:
     async def disconnect(self) -> None:
         # Nothing to disconnect.
         pass
+
+    async def check(self) -> None:
+        # Subscriptions live as long as the connection, which is checked by the connector.
+        pass
@@ -1,11 +1,35 @@
+import asyncio
+from dataclasses import dataclass, field
 from typing import Protocol
 
 from holo.nats.client import HoloNats
 
 
+@dataclass
+class SubscriberStartup:
+    """
+    State shared by the subscribers connecting at the same time: the
+    semaphore bounding their requests to the server, and the stream setups
+    by stream name, so subscribers of the same stream share a single setup.
+    """
+
+    semaphore: asyncio.Semaphore
+    stream_setups: dict[str, asyncio.Task] = field(default_factory=dict)
+
+
 class NatsSubscriberProtocol(Protocol):
     async def start(self) -> None: ...
 
     async def disconnect(self) -> None: ...
 
-    async def connect(self, con: HoloNats, consumer_name: str) -> None: ...
+    async def connect(
+        self,
+        con: HoloNats,
+        consumer_name: str,
+        publish_con: HoloNats | None = None,
+        startup: SubscriberStartup | None = None,
+    ) -> None: ...
+
+    async def reconnect(self, con: HoloNats, publish_con: HoloNats | None = None) -> None: ...
+
+    async def check(self) -> None: ...
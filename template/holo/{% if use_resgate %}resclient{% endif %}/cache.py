@@ -0,0 +1,288 @@
+from collections import OrderedDict
+from hashlib import sha256
+from time import monotonic
+from typing import Any
+
+import orjson
+
+from holo import serialization
+from holo.resclient.metrics import CACHE_HITS, CACHE_MISSES, CACHE_SIZE
+from holo.workers import set_gauge_function
+
+
+def rid_matches(pattern: str, rid: str) -> bool:
+    """
+    Check if `rid` matches the resource `pattern`, using NATS wildcards:
+    "*" matches one part and ">" matches all remaining parts.
+    """
+    rid_parts = rid.split(".")
+    pattern_parts = pattern.split(".")
+    for i, part in enumerate(pattern_parts):
+        if part == ">":
+            return len(rid_parts) > i
+        if i >= len(rid_parts) or part not in ("*", rid_parts[i]):
+            return False
+    return len(pattern_parts) == len(rid_parts)
+
+
+class _Entry:
+    __slots__ = ("expires", "payload", "response")
+
+    def __init__(self, expires: float, payload: bytes) -> None:
+        self.expires = expires
+        self.payload: bytes | None = payload
+        self.response: dict | None = None
+
+    def get_response(self) -> dict:
+        if self.response is None:
+            self.response = serialization.codec.loads(self.payload)
+        return self.response
+
+    def get_payload(self) -> bytes:
+        if self.payload is None:
+            self.payload = serialization.codec.dumps(self.response)
+        return self.payload
+
+
+class GetResponseCache:
+    """
+    LRU cache of encoded GET responses by rid and query, holding at most
+    `size` responses for `ttl` seconds.
+
+    Events published by `ResClient` are applied to the cached responses:
+    changes and collection add/remove are patched into the cached model or
+    collection, everything else drops the cached responses of the rid.
+
+    The hit ratio can be derived from `resgate_cache_hits_total` and
+    `resgate_cache_misses_total`.
+    """
+
+    def __init__(self, pattern: str, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, str | None], _Entry] = OrderedDict()
+        self._queries: dict[str, set[str | None]] = {}
+
+        # Responses of rids that changed while being fetched are not cached,
+        # they might already be outdated.
+        self._in_flight: dict[str, int] = {}
+        self._stale: set[str] = set()
+
+        self._hits = CACHE_HITS.labels(method="get", pattern=pattern)
+        self._misses = CACHE_MISSES.labels(method="get", pattern=pattern)
+        set_gauge_function(CACHE_SIZE.labels(method="get", pattern=pattern), lambda: len(self._entries))
+
+    def get(self, rid: str, query: str | None = None) -> bytes | None:
+        entry = self._entries.get((rid, query))
+        if entry is None or entry.expires <= monotonic():
+            if entry is not None:
+                self._remove(rid, query)
+            self._misses.inc()
+            return None
+
+        self._entries.move_to_end((rid, query))
+        self._hits.inc()
+        return entry.get_payload()
+
+    def start(self, rid: str) -> None:
+        """
+        Mark `rid` as being fetched, call `set` or `cancel` when done.
+        """
+        self._in_flight[rid] = self._in_flight.get(rid, 0) + 1
+
+    def cancel(self, rid: str) -> None:
+        self._in_flight[rid] -= 1
+        if not self._in_flight[rid]:
+            del self._in_flight[rid]
+            self._stale.discard(rid)
+
+    def set(self, rid: str, query: str | None, payload: bytes) -> None:
+        stale = rid in self._stale
+        self.cancel(rid)
+        if stale:
+            return
+
+        self._entries[(rid, query)] = _Entry(monotonic() + self.ttl, payload)
+        self._entries.move_to_end((rid, query))
+        self._queries.setdefault(rid, set()).add(query)
+
+        while len(self._entries) > self.size:
+            (evicted_rid, evicted_query), _ = self._entries.popitem(last=False)
+            self._discard_query(evicted_rid, evicted_query)
+
+    def change(self, rid: str, values: dict) -> None:
+        """
+        Apply the changed `values` to the cached model of `rid`.
+        """
+
+        def patch(result: dict) -> bool:
+            if not isinstance(model := result.get("model"), dict):
+                return False
+            for key, value in self._normalize(values).items():
+                if isinstance(value, dict) and value.get("action") == "delete":
+                    model.pop(key, None)
+                else:
+                    model[key] = value
+            return True
+
+        self._patch(rid, patch)
+
+    def add(self, rid: str, idx: int, value: Any) -> None:
+        """
+        Insert `value` in the cached collection of `rid`.
+        """
+
+        def patch(result: dict) -> bool:
+            if not isinstance(collection := result.get("collection"), list) or not 0 <= idx <= len(collection):
+                return False
+            collection.insert(idx, self._normalize(value))
+            return True
+
+        self._patch(rid, patch)
+
+    def remove(self, rid: str, idx: int) -> None:
+        """
+        Remove the value at `idx` from the cached collection of `rid`.
+        """
+
+        def patch(result: dict) -> bool:
+            if not isinstance(collection := result.get("collection"), list) or not 0 <= idx < len(collection):
+                return False
+            del collection[idx]
+            return True
+
+        self._patch(rid, patch)
+
+    def invalidate(self, rid: str) -> None:
+        """
+        Drop all cached responses of `rid`.
+        """
+        if rid in self._in_flight:
+            self._stale.add(rid)
+        for query in self._queries.pop(rid, ()):
+            del self._entries[(rid, query)]
+
+    def reset(self, patterns: list[str]) -> None:
+        """
+        Drop all cached responses of rids matching any of `patterns`.
+        """
+        for rid in list(self._queries) + list(self._in_flight):
+            if any(rid_matches(pattern, rid) for pattern in patterns):
+                self.invalidate(rid)
+
+    def _patch(self, rid: str, patch) -> None:
+        """
+        Patch the cached response of `rid` without a query, responses with
+        a query can't be patched and are dropped.
+        """
+        if rid in self._in_flight:
+            self._stale.add(rid)
+
+        queries = self._queries.get(rid)
+        if not queries:
+            return
+
+        entry = self._entries.get((rid, None))
+        if entry is None or not patch(entry.get_response()["result"]):
+            self.invalidate(rid)
+            return
+
+        entry.payload = None
+        for query in queries - {None}:
+            self._remove(rid, query)
+
+    def _remove(self, rid: str, query: str | None) -> None:
+        del self._entries[(rid, query)]
+        self._discard_query(rid, query)
+
+    def _discard_query(self, rid: str, query: str | None) -> None:
+        queries = self._queries[rid]
+        queries.discard(query)
+        if not queries:
+            del self._queries[rid]
+
+    @staticmethod
+    def _normalize(value: Any) -> Any:
+        """
+        Turn `value` into what it looks like after decoding a response.
+        """
+        return serialization.codec.loads(serialization.codec.dumps(value))
+
+
+class AccessCache:
+    """
+    LRU cache of encoded ACCESS responses by connection id, token and
+    resource, holding at most `size` responses for `ttl` seconds. The
+    resource is the rid, or the handler's pattern when the access callback
+    decides per pattern.
+
+    Connection token events published by `ResClient` drop the responses of
+    the connection, a system reset drops all responses.
+    """
+
+    def __init__(self, pattern: str, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, bytes, str], tuple[float, bytes]] = OrderedDict()
+        self._keys_by_cid: dict[str, set[tuple[str, bytes, str]]] = {}
+
+        # Bumped on every invalidation, responses fetched while it changed
+        # are not cached, they might already be outdated.
+        self.version = 0
+
+        self._hits = CACHE_HITS.labels(method="access", pattern=pattern)
+        self._misses = CACHE_MISSES.labels(method="access", pattern=pattern)
+        set_gauge_function(CACHE_SIZE.labels(method="access", pattern=pattern), lambda: len(self._entries))
+
+    @staticmethod
+    def get_key(cid: str, token: dict | None, resource: str) -> tuple[str, bytes, str]:
+        # Sorted keys, so the same claims in another order share the key.
+        token_hash = sha256(orjson.dumps(token, option=orjson.OPT_SORT_KEYS)).digest()
+        return cid, token_hash, resource
+
+    def get(self, key: tuple[str, bytes, str]) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= monotonic():
+            if entry is not None:
+                self._remove(key)
+            self._misses.inc()
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits.inc()
+        return entry[1]
+
+    def set(self, key: tuple[str, bytes, str], payload: bytes, version: int) -> None:
+        if version != self.version:
+            return
+
+        self._entries[key] = (monotonic() + self.ttl, payload)
+        self._entries.move_to_end(key)
+        self._keys_by_cid.setdefault(key[0], set()).add(key)
+
+        while len(self._entries) > self.size:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._discard_key(evicted_key)
+
+    def invalidate(self, cid: str) -> None:
+        """
+        Drop all cached responses of connection `cid`.
+        """
+        self.version += 1
+        for key in self._keys_by_cid.pop(cid, ()):
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self.version += 1
+        self._entries.clear()
+        self._keys_by_cid.clear()
+
+    def _remove(self, key: tuple[str, bytes, str]) -> None:
+        del self._entries[key]
+        self._discard_key(key)
+
+    def _discard_key(self, key: tuple[str, bytes, str]) -> None:
+        keys = self._keys_by_cid[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_cid[key[0]]
@@ -0,0 +1,142 @@
+import json
+import time
+
+import pytest
+
+from holo.resclient.cache import AccessCache, GetResponseCache, rid_matches
+
+
+def _payload(result: dict) -> bytes:
+    return json.dumps({"result": result}).encode()
+
+
+def _cached(cache: GetResponseCache, rid: str, query: str | None = None) -> dict | None:
+    payload = cache.get(rid, query)
+    return json.loads(payload)["result"] if payload is not None else None
+
+
+def _fill(cache: GetResponseCache, rid: str, result: dict, query: str | None = None) -> None:
+    cache.start(rid)
+    cache.set(rid, query, _payload(result))
+
+
+@pytest.mark.parametrize(
+    ("pattern", "rid", "expected"),
+    [
+        ("foo.bar.1", "foo.bar.1", True),
+        ("foo.bar.1", "foo.bar.2", False),
+        ("foo.*.1", "foo.bar.1", True),
+        ("foo.*", "foo.bar.1", False),
+        ("foo.>", "foo.bar.1", True),
+        ("foo.>", "foo", False),
+    ],
+)
+def test_rid_matches(pattern: str, rid: str, expected: bool) -> None:
+    """
+    Test resource patterns match like NATS subjects.
+    """
+    assert rid_matches(pattern, rid) is expected
+
+
+def test_change_patches_model() -> None:
+    """
+    Test a change event is applied to the cached model and drops query results.
+    """
+    cache = GetResponseCache("test.change.*", size=10, ttl=60)
+    _fill(cache, "test.change.1", {"model": {"name": "foo", "age": 1}})
+    _fill(cache, "test.change.1", {"model": {"name": "foo"}}, query="fields=name")
+
+    cache.change("test.change.1", {"name": "bar", "age": {"action": "delete"}})
+
+    assert _cached(cache, "test.change.1") == {"model": {"name": "bar"}}
+    assert _cached(cache, "test.change.1", "fields=name") is None
+
+
+def test_collection_add_remove() -> None:
+    """
+    Test add and remove events are applied to the cached collection.
+    """
+    cache = GetResponseCache("test.collection", size=10, ttl=60)
+    _fill(cache, "test.collection", {"collection": [{"rid": "a"}, {"rid": "c"}]})
+
+    cache.add("test.collection", 1, {"rid": "b"})
+    assert _cached(cache, "test.collection") == {"collection": [{"rid": "a"}, {"rid": "b"}, {"rid": "c"}]}
+
+    cache.remove("test.collection", 0)
+    assert _cached(cache, "test.collection") == {"collection": [{"rid": "b"}, {"rid": "c"}]}
+
+    cache.remove("test.collection", 5)
+    assert _cached(cache, "test.collection") is None
+
+
+def test_delete_and_reset() -> None:
+    """
+    Test delete and system reset drop the cached responses.
+    """
+    cache = GetResponseCache("test.reset.*", size=10, ttl=60)
+    for rid in ("test.reset.1", "test.reset.2", "other.reset.1"):
+        _fill(cache, rid, {"model": {}})
+
+    cache.invalidate("test.reset.1")
+    cache.reset(["test.>"])
+
+    assert _cached(cache, "test.reset.1") is None
+    assert _cached(cache, "test.reset.2") is None
+    assert _cached(cache, "other.reset.1") == {"model": {}}
+
+
+def test_size_and_ttl() -> None:
+    """
+    Test the least recently used response is evicted and responses expire.
+    """
+    cache = GetResponseCache("test.limits.*", size=2, ttl=0.1)
+    _fill(cache, "test.limits.1", {"model": {}})
+    _fill(cache, "test.limits.2", {"model": {}})
+    cache.get("test.limits.1")
+    _fill(cache, "test.limits.3", {"model": {}})
+
+    assert _cached(cache, "test.limits.2") is None
+    assert _cached(cache, "test.limits.1") == {"model": {}}
+
+    time.sleep(0.1)
+
+    assert _cached(cache, "test.limits.3") is None
+
+
+def test_change_during_fetch() -> None:
+    """
+    Test a response is not cached when the resource changed while fetching it.
+    """
+    cache = GetResponseCache("test.fetch.*", size=10, ttl=60)
+    cache.start("test.fetch.1")
+    cache.change("test.fetch.1", {"name": "bar"})
+    cache.set("test.fetch.1", None, _payload({"model": {"name": "foo"}}))
+
+    assert _cached(cache, "test.fetch.1") is None
+
+    _fill(cache, "test.fetch.1", {"model": {"name": "bar"}})
+
+    assert _cached(cache, "test.fetch.1") == {"model": {"name": "bar"}}
+
+
+def test_access_cache() -> None:
+    """
+    Test access responses are cached by connection and token, and dropped
+    when the token of the connection changes.
+    """
+    cache = AccessCache("test.access.*", size=10, ttl=60)
+    key = cache.get_key("cid1", {"user": 1}, "test.access.1")
+    other_key = cache.get_key("cid2", {"user": 2}, "test.access.1")
+    cache.set(key, b"yes", cache.version)
+    cache.set(other_key, b"no", cache.version)
+
+    assert cache.get(key) == b"yes"
+    assert cache.get(cache.get_key("cid1", {"user": 2}, "test.access.1")) is None
+    assert cache.get_key("cid1", {"user": 1, "exp": 2}, "r") == cache.get_key("cid1", {"exp": 2, "user": 1}, "r")
+
+    version = cache.version
+    cache.invalidate("cid1")
+    cache.set(key, b"yes", version)
+
+    assert cache.get(key) is None
+    assert cache.get(other_key) == b"no"
@@ -1,12 +1,19 @@
-import json
+import asyncio
 import logging
-from collections.abc import Callable
+from collections.abc import AsyncGenerator, Callable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from time import perf_counter
 
+from holo import serialization
 from holo.config.resclient import ResgateConfig
 from holo.data.connectors import NatsConnector
-from holo.nats.client import HoloNats
+from holo.nats.client import ConnectionRole, HoloNats
+from holo.nats.metrics import STARTUP_TIME
+from holo.resclient.cache import AccessCache, GetResponseCache
+from holo.resclient.coalescer import EventBuffer
 from holo.resclient.handlers import AccessHandler, GetHandler, Handler, ResGateAccessCallback, ResGateGetCallback
-from holo.utils import to_json_string
+from holo.resclient.state import ModelStates
 
 
 logger = logging.getLogger(__name__)
@@ -19,46 +26,125 @@ class ResClient:
 
     def __init__(self, connector: NatsConnector, config: ResgateConfig) -> None:
         self._enabled = config.ENABLE_RESGATE
+        self._request_timeout = config.RESGATE_REQUEST_TIMEOUT
         self._connector = connector
         self._handlers: list[Handler] = []
+        self._caches: list[GetResponseCache] = []
+        self._access_caches: list[AccessCache] = []
+        self._states = ModelStates(config.RESGATE_CHANGE_STATE_SIZE) if config.RESGATE_CHANGE_STATE_SIZE else None
         self._nats_connection: HoloNats
 
+        self._coalesce_window = config.RESGATE_COALESCE_WINDOW
+        self._window_buffer = EventBuffer()
+        self._flush_task: asyncio.Task | None = None
+        self._transaction_buffer: ContextVar[EventBuffer | None] = ContextVar(
+            f"resclient_buffer_{id(self)}",
+            default=None,
+        )
+
     async def startup(self) -> None:
         logger.info("Starting ResClient")
-        self._nats_connection = await self._connector.new_connection()
+        before_time = perf_counter()
+        self._nats_connection = await self._connector.get_connection(ConnectionRole.RESGATE)
+
+        async def connect_handler(i: int, handler: Handler) -> None:
+            await handler.connect(await self._connector.get_connection(ConnectionRole.RESGATE, i))
+
+        await asyncio.gather(*(connect_handler(i, handler) for i, handler in enumerate(self._handlers)))
 
-        for handler in self._handlers:
-            await handler.connect(self._nats_connection)
+        duration = perf_counter() - before_time
+        STARTUP_TIME.labels(phase="resgate").set(duration)
+        logger.info("Started ResClient with %d handlers in %.3fs", len(self._handlers), duration)
 
     async def shutdown(self) -> None:
-        await self._connector.close_connection()
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._publish_buffer(self._window_buffer)
+        await self._connector.close_connection(ConnectionRole.RESGATE)
 
-    def get(self, subject: str) -> Callable:
+    @asynccontextmanager
+    async def coalesce(self) -> AsyncGenerator[None]:
         """
-        Decorator for GET requests.
+        Coalesce the events published within the block, like all updates of
+        a transaction, and publish them when the block exits. See
+        `EventBuffer` for how events are coalesced.
 
         Usage:
-        @client.get("foo.bar")
+
+        ```
+        async with client.coalesce():
+            await client.event_change("foo.bar.1", {"foo": "bar"})
+            await client.event_change("foo.bar.1", {"bar": "baz"})
+        ```
+        """
+        if self._transaction_buffer.get() is not None:
+            yield
+            return
+
+        buffer = EventBuffer()
+        token = self._transaction_buffer.set(buffer)
+        try:
+            yield
+        finally:
+            self._transaction_buffer.reset(token)
+            await self._publish_buffer(buffer)
+
+    def get(self, subject: str, max_tasks: int = 1, cache_size: int = 0, cache_ttl: float = 60.0) -> Callable:
+        """
+        Decorator for GET requests, `max_tasks` requests are processed
+        concurrently.
+
+        With a `cache_size` up to that many found responses are cached for
+        `cache_ttl` seconds. Events published through this client update the
+        cache, only use it when all changes to the resources are published
+        by this client.
+
+        Usage:
+        @client.get("foo.bar", max_tasks=10, cache_size=1000)
         async def get_foo_bar(model: GetResGateModel) -> dict:
             ...
             return {"model": {"foo": "bar"}}
         """
 
         def get_handler(cb: ResGateGetCallback) -> ResGateGetCallback:
-            self._handlers.append(GetHandler(subject, cb))
+            handler = GetHandler(
+                subject,
+                cb,
+                max_tasks=max_tasks,
+                timeout=self._request_timeout,
+                cache_size=cache_size,
+                cache_ttl=cache_ttl,
+                states=self._states,
+            )
+            self._handlers.append(handler)
+            if handler.cache is not None:
+                self._caches.append(handler.cache)
 
             return cb
 
         return get_handler
 
-    def access(self, subject: str) -> Callable:
+    def access(
+        self,
+        subject: str,
+        max_tasks: int = 1,
+        cache_size: int = 0,
+        cache_ttl: float = 60.0,
+        cache_by_pattern: bool = False,
+    ) -> Callable:
         """
-        Decorator for ACCESS requests.
+        Decorator for ACCESS requests, `max_tasks` requests are processed
+        concurrently.
+
+        With a `cache_size` up to that many responses are cached for
+        `cache_ttl` seconds by connection, token and rid, or by `subject`
+        with `cache_by_pattern`. Publish token changes with
+        `connection_token` to drop the responses of the connection.
 
         Usage:
 
         ```
-        @client.access("foo.bar")
+        @client.access("foo.bar", max_tasks=10, cache_size=1000)
         async def access_foo_bar(model: AccessResGateModel) -> bool:
             ...
             return True / False
@@ -66,7 +152,18 @@ class ResClient:
         """
 
         def access_handler(cb: ResGateAccessCallback) -> ResGateAccessCallback:
-            self._handlers.append(AccessHandler(subject, cb))
+            handler = AccessHandler(
+                subject,
+                cb,
+                max_tasks=max_tasks,
+                timeout=self._request_timeout,
+                cache_size=cache_size,
+                cache_ttl=cache_ttl,
+                cache_by_pattern=cache_by_pattern,
+            )
+            self._handlers.append(handler)
+            if handler.cache is not None:
+                self._access_caches.append(handler.cache)
 
             return cb
 
@@ -88,10 +185,35 @@ class ResClient:
             }
 
             if payload:
-                kwargs["payload"] = json.dumps(payload, default=to_json_string).encode()
+                kwargs["payload"] = serialization.codec.dumps(payload)
 
             await self._nats_connection.publish(**kwargs)
 
+    def _get_buffer(self) -> EventBuffer | None:
+        """
+        Get the buffer to coalesce events in, if any.
+        """
+        if (buffer := self._transaction_buffer.get()) is not None:
+            return buffer
+        if not self._coalesce_window:
+            return None
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_window())
+        return self._window_buffer
+
+    async def _flush_window(self) -> None:
+        await asyncio.sleep(self._coalesce_window)
+        self._flush_task = None
+        try:
+            await self._publish_buffer(self._window_buffer)
+        except Exception:
+            logger.exception("Error publishing coalesced Resgate events")
+
+    async def _publish_buffer(self, buffer: EventBuffer) -> None:
+        for subject, payload, headers in buffer.drain():
+            await self._publish(subject, payload, headers=headers)
+
     async def event_change(
         self,
         resource_id: str,
@@ -99,9 +221,17 @@ class ResClient:
         headers=None,
     ) -> None:
         """
-        Publish a change event for the given resource_id.
+        Publish a change event for the given resource_id. With
+        RESGATE_CHANGE_STATE_SIZE only the changed values are published.
         """
-        await self._publish(f"event.{resource_id}.change", {"values": data}, headers=headers)
+        values = data if self._states is None else self._states.diff(resource_id, data)
+        if values is not None:
+            if (buffer := self._get_buffer()) is not None:
+                buffer.change(resource_id, values, headers)
+            else:
+                await self._publish(f"event.{resource_id}.change", {"values": values}, headers=headers)
+        for cache in self._caches:
+            cache.change(resource_id, data)
 
     async def system_reset(
         self,
@@ -111,7 +241,16 @@ class ResClient:
         """
         Publish a system reset event for the given resource.
         """
-        await self._publish("system.reset", {"resources": data}, headers=headers)
+        if (buffer := self._get_buffer()) is not None:
+            buffer.reset(data, headers)
+        else:
+            await self._publish("system.reset", {"resources": data}, headers=headers)
+        if self._states is not None:
+            self._states.reset(data)
+        for cache in self._caches:
+            cache.reset(data)
+        for access_cache in self._access_caches:
+            access_cache.clear()
 
     async def event_add_rid_to_collection(
         self,
@@ -123,11 +262,16 @@ class ResClient:
         """
         Publish a new RID being added to a collection.
         """
-        await self._publish(
-            f"event.{collection_resource_id}.add",
-            {"idx": added_idx, "value": {"rid": added_resource_id}},
-            headers=headers,
-        )
+        if (buffer := self._get_buffer()) is not None:
+            buffer.add(collection_resource_id, added_idx, {"rid": added_resource_id}, headers)
+        else:
+            await self._publish(
+                f"event.{collection_resource_id}.add",
+                {"idx": added_idx, "value": {"rid": added_resource_id}},
+                headers=headers,
+            )
+        for cache in self._caches:
+            cache.add(collection_resource_id, added_idx, {"rid": added_resource_id})
 
     async def event_remove_item_from_collection(
         self,
@@ -138,7 +282,12 @@ class ResClient:
         """
         Publish a remove event for the given resource_id.
         """
-        await self._publish(f"event.{collection_resource_id}.remove", {"idx": removed_idx}, headers=headers)
+        if (buffer := self._get_buffer()) is not None:
+            buffer.remove(collection_resource_id, removed_idx, headers)
+        else:
+            await self._publish(f"event.{collection_resource_id}.remove", {"idx": removed_idx}, headers=headers)
+        for cache in self._caches:
+            cache.remove(collection_resource_id, removed_idx)
 
     async def event_delete(
         self,
@@ -148,4 +297,24 @@ class ResClient:
         """
         Publish a delete event for the given resource_id.
         """
-        await self._publish(f"event.{resource_id}.delete", None, headers=headers)
+        if (buffer := self._get_buffer()) is not None:
+            buffer.delete(resource_id, headers)
+        else:
+            await self._publish(f"event.{resource_id}.delete", None, headers=headers)
+        if self._states is not None:
+            self._states.delete(resource_id)
+        for cache in self._caches:
+            cache.invalidate(resource_id)
+
+    async def connection_token(
+        self,
+        cid: str,
+        token: dict | None,
+        headers=None,
+    ) -> None:
+        """
+        Publish a new token for the given connection id.
+        """
+        await self._publish(f"conn.{cid}.token", {"token": token}, headers=headers)
+        for access_cache in self._access_caches:
+            access_cache.invalidate(cid)
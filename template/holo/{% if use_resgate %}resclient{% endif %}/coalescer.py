@@ -0,0 +1,84 @@
+from typing import Any
+
+from holo.resclient.metrics import EVENTS_COALESCED
+
+
+class _Event:
+    __slots__ = ("headers", "kind", "payload")
+
+    def __init__(self, kind: str, payload: dict | None, headers: Any) -> None:
+        self.kind = kind
+        self.payload = payload
+        self.headers = headers
+
+
+class EventBuffer:
+    """
+    Buffer of Resgate events, coalesced into as few events as possible
+    without changing the end result for Resgate.
+
+    - consecutive changes of a resource are merged into one change,
+    - an add directly followed by a remove of the same index cancel out,
+    - a delete drops the pending events of the resource,
+    - system resets are merged into one reset with unique resources.
+
+    Events of a resource keep their order, resets are published last.
+    """
+
+    def __init__(self) -> None:
+        self._events: dict[str, list[_Event]] = {}
+        self._resources: dict[str, None] = {}
+        self._reset_headers: Any = None
+
+    def __bool__(self) -> bool:
+        return bool(self._events or self._resources)
+
+    def change(self, rid: str, values: dict, headers: Any = None) -> None:
+        events = self._events.setdefault(rid, [])
+        if events and events[-1].kind == "change":
+            events[-1].payload["values"].update(values)
+            events[-1].headers = headers
+            EVENTS_COALESCED.labels(event="change").inc()
+        else:
+            events.append(_Event("change", {"values": dict(values)}, headers))
+
+    def add(self, rid: str, idx: int, value: Any, headers: Any = None) -> None:
+        self._events.setdefault(rid, []).append(_Event("add", {"idx": idx, "value": value}, headers))
+
+    def remove(self, rid: str, idx: int, headers: Any = None) -> None:
+        events = self._events.setdefault(rid, [])
+        if events and events[-1].kind == "add" and events[-1].payload["idx"] == idx:
+            events.pop()
+            if not events:
+                del self._events[rid]
+            EVENTS_COALESCED.labels(event="collection").inc(2)
+        else:
+            events.append(_Event("remove", {"idx": idx}, headers))
+
+    def delete(self, rid: str, headers: Any = None) -> None:
+        if dropped := self._events.pop(rid, None):
+            EVENTS_COALESCED.labels(event="delete").inc(len(dropped))
+        self._events[rid] = [_Event("delete", None, headers)]
+
+    def reset(self, resources: list[str], headers: Any = None) -> None:
+        if self._resources:
+            EVENTS_COALESCED.labels(event="reset").inc()
+        self._resources.update(dict.fromkeys(resources))
+        self._reset_headers = headers
+
+    def drain(self) -> list[tuple[str, dict | None, Any]]:
+        """
+        Empty the buffer, returning the subject, payload and headers of each
+        event to publish.
+        """
+        drained = [
+            (f"event.{rid}.{event.kind}", event.payload, event.headers)
+            for rid, events in self._events.items()
+            for event in events
+        ]
+        if self._resources:
+            drained.append(("system.reset", {"resources": list(self._resources)}, self._reset_headers))
+
+        self._events = {}
+        self._resources = {}
+        return drained
@@ -0,0 +1,49 @@
+from holo.resclient.coalescer import EventBuffer
+
+
+def test_merge_changes() -> None:
+    """
+    Test consecutive changes of a resource are merged into one change.
+    """
+    buffer = EventBuffer()
+    buffer.change("foo.bar.1", {"name": "foo", "age": 1})
+    buffer.change("foo.bar.2", {"name": "baz"})
+    buffer.change("foo.bar.1", {"name": "bar"})
+
+    assert buffer.drain() == [
+        ("event.foo.bar.1.change", {"values": {"name": "bar", "age": 1}}, None),
+        ("event.foo.bar.2.change", {"values": {"name": "baz"}}, None),
+    ]
+    assert not buffer
+
+
+def test_collapse_add_remove() -> None:
+    """
+    Test an add directly followed by a remove of the same index cancel out.
+    """
+    buffer = EventBuffer()
+    buffer.add("foo.bars", 0, {"rid": "foo.bar.1"})
+    buffer.add("foo.bars", 1, {"rid": "foo.bar.2"})
+    buffer.remove("foo.bars", 1)
+    buffer.remove("foo.bars", 3)
+
+    assert buffer.drain() == [
+        ("event.foo.bars.add", {"idx": 0, "value": {"rid": "foo.bar.1"}}, None),
+        ("event.foo.bars.remove", {"idx": 3}, None),
+    ]
+
+
+def test_delete_and_reset() -> None:
+    """
+    Test a delete drops pending events and resets are merged.
+    """
+    buffer = EventBuffer()
+    buffer.reset(["foo.bar.>"])
+    buffer.change("foo.bar.1", {"name": "foo"})
+    buffer.delete("foo.bar.1")
+    buffer.reset(["foo.baz.>", "foo.bar.>"])
+
+    assert buffer.drain() == [
+        ("event.foo.bar.1.delete", None, None),
+        ("system.reset", {"resources": ["foo.bar.>", "foo.baz.>"]}, None),
+    ]
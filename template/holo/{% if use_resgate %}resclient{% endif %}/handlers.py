@@ -1,29 +1,135 @@
-import json
-from collections.abc import Awaitable, Callable
+import asyncio
+import logging
+from collections import deque
+from collections.abc import Awaitable, Callable, Coroutine
+from time import perf_counter
 from typing import TypeVar
 
 from nats.aio.msg import Msg
 
+from holo import serialization
 from holo.nats.client import HoloNats
+from holo.resclient.cache import AccessCache, GetResponseCache
+from holo.resclient.metrics import (
+    REQUEST_TIME,
+    REQUEST_TIMEOUTS,
+    REQUESTS_COLLAPSED,
+    REQUESTS_IN_PROGRESS,
+    REQUESTS_WAITING,
+)
 from holo.resclient.models import AccessResGateModel, BaseResGateModel, GetResGateModel
-from holo.utils import to_json_string
+from holo.resclient.state import ModelStates
 
 
 T = TypeVar("T")
 type ResGateAccessCallback = Callable[[AccessResGateModel], Awaitable[bool]]
 type ResGateGetCallback = Callable[[GetResGateModel], Awaitable[bool]]
 
+logger = logging.getLogger(__name__)
+
 
 class Handler[T: BaseResGateModel]:
     _subject: str
     _model: type[T]
 
+    def __init__(self, subject: str, max_tasks: int = 1, timeout: float = 3.0) -> None:
+        """
+        Args:
+            subject (str): Full subject to subscribe to, ie. "get.foo.bar.*".
+            max_tasks (int): Number of requests processed concurrently.
+            timeout (float): Requests received this long ago that didn't get a
+                free slot are dropped, Resgate has stopped waiting for them.
+        """
+        self._subject = subject
+        self._max_tasks = max_tasks
+        self._timeout = timeout
+
+        # This set is used to gather async background tasks, to prevent them being garbage collected mid execution.
+        # See: https://docs.python.org/3/library/asyncio-task.html#asyncio.create_task
+        self._tasks: set[asyncio.Task] = set()
+
+        # Requests waiting for a free slot with the time they were received,
+        # oldest first, and the number of slots handling requests.
+        self._pending: deque[tuple[float, Msg]] = deque()
+        self._active = 0
+
+        method, pattern = subject.split(".", 1)
+        self._in_progress = REQUESTS_IN_PROGRESS.labels(method=method, pattern=pattern)
+        self._waiting = REQUESTS_WAITING.labels(method=method, pattern=pattern)
+        self._request_time = REQUEST_TIME.labels(method=method, pattern=pattern)
+        self._request_timeouts = REQUEST_TIMEOUTS.labels(method=method, pattern=pattern)
+
     async def connect(self, nc: HoloNats) -> None:
         """
         Subscribe to topic and set callback for incoming events.
         """
         self._nats_connection = nc
-        await self._nats_connection.subscribe(self._subject, queue=self._subject, cb=self._handle_request)
+        await self._nats_connection.subscribe(self._subject, queue=self._subject, cb=self._on_request)
+
+    async def _on_request(self, msg: Msg) -> None:
+        """
+        Queue the request for a free slot, so the subscription can deliver the
+        next one right away.
+        """
+        self._enqueue(msg)
+
+    def _enqueue(self, msg: Msg) -> None:
+        """
+        Queue the request, and take a free slot to handle the queued requests
+        in the background when there is one. There's a task per busy slot,
+        not per request.
+        """
+        received_time = perf_counter()
+        self._pending.append((received_time, msg))
+        self._waiting.inc()
+
+        # Resgate has given up on the oldest requests, don't keep them around.
+        while received_time - self._pending[0][0] >= self._timeout:
+            self._drop(self._pending.popleft()[1])
+            self._waiting.dec()
+
+        if self._active < self._max_tasks:
+            self._active += 1
+            self._add_task(self._run_slot())
+
+    def _add_task(self, coro: Coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run_slot(self) -> None:
+        """
+        Handle the queued requests one after another until none are left,
+        dropping those that waited `timeout` seconds since they were received.
+        """
+        try:
+            while self._pending:
+                received_time, msg = self._pending.popleft()
+                self._waiting.dec()
+                if perf_counter() - received_time >= self._timeout:
+                    self._drop(msg)
+                else:
+                    await self._run_request(msg, received_time)
+        finally:
+            self._active -= 1
+
+    def _drop(self, msg: Msg) -> None:
+        self._request_timeouts.inc()
+        logger.warning("Dropped Resgate request %s, it timed out before being processed", msg.subject)
+
+    async def _run_request(self, msg: Msg, received_time: float) -> None:
+        """
+        Handle the request, its time is measured from when it was received.
+        """
+        self._in_progress.inc()
+        try:
+            await self._handle_request(msg)
+        except Exception:
+            logger.exception("Error handling Resgate request %s", msg.subject)
+        finally:
+            self._in_progress.dec()
+            self._request_time.observe(perf_counter() - received_time)
 
     def _get_id(self, subject: str) -> str:
         """
@@ -36,23 +142,28 @@ class Handler[T: BaseResGateModel]:
         """
         Callback that is called for each ResGate request.
         """
-        model = self._model(
+        await self._reply(msg, await self._respond(msg, serialization.codec.loads(msg.data)))
+
+    async def _reply(self, msg: Msg, payload: bytes) -> None:
+        headers = msg.headers or {}
+        await self._nats_connection.publish(msg.reply, payload, headers=headers)
+
+    async def _respond(self, msg: Msg, data: dict) -> bytes:
+        """
+        Get the encoded response to the request.
+        """
+        return self._encode(await self._process(self._get_model(msg, data)))
+
+    def _get_model(self, msg: Msg, data: dict) -> T:
+        return self._model(
             subject=msg.subject,
             reply=msg.reply,
-            data=json.loads(msg.data),
+            data=data,
             id=self._get_id(msg.subject),
         )
-        response = await self._process(model)
 
-        headers = msg.headers or {}
-        await self._nats_connection.publish(
-            msg.reply,
-            json.dumps(
-                response,
-                default=to_json_string,
-            ).encode(),
-            headers=headers,
-        )
+    def _encode(self, response: dict) -> bytes:
+        return serialization.codec.dumps(response)
 
     async def _process(self, model: T) -> dict:
         raise NotImplementedError
@@ -65,9 +176,112 @@ class GetHandler(Handler[GetResGateModel]):
 
     _model = GetResGateModel
 
-    def __init__(self, subject: str, callback: ResGateGetCallback) -> None:
-        self._subject = f"get.{subject}"
+    def __init__(
+        self,
+        subject: str,
+        callback: ResGateGetCallback,
+        max_tasks: int = 1,
+        timeout: float = 3.0,
+        cache_size: int = 0,
+        cache_ttl: float = 60.0,
+        states: ModelStates | None = None,
+    ) -> None:
+        """
+        Args:
+            subject (str): Resource pattern to subscribe to, ie. "foo.bar.*".
+            callback (ResGateGetCallback): Returns the resource, or nothing
+                when it's not found.
+            max_tasks (int): Number of requests processed concurrently.
+            timeout (float): See `Handler`.
+            cache_size (int): Number of responses to cache, 0 disables the
+                cache. See `GetResponseCache`.
+            cache_ttl (float): Seconds a response is cached.
+            states (ModelStates | None): Remembers the returned models.
+        """
+        super().__init__(f"get.{subject}", max_tasks=max_tasks, timeout=timeout)
         self._callback = callback
+        self._states = states
+        self.cache = GetResponseCache(subject, cache_size, cache_ttl) if cache_size else None
+
+        # Responses of the requests being processed by subject and data.
+        self._in_flight: dict[tuple[str, bytes], asyncio.Future[bytes]] = {}
+        self._collapsed = REQUESTS_COLLAPSED.labels(method="get", pattern=subject)
+
+    async def _on_request(self, msg: Msg) -> None:
+        """
+        Collapse concurrent requests for the same resource and query, Resgate
+        only sends the query as data, into the request being processed or
+        waiting for a slot. Its response is sent to all of them.
+        """
+        key = (msg.subject, msg.data)
+        if (response := self._in_flight.get(key)) is not None:
+            self._collapsed.inc()
+            self._add_task(self._reply_collapsed(msg, response))
+            return
+
+        self._in_flight[key] = asyncio.get_running_loop().create_future()
+        self._enqueue(msg)
+
+    def _drop(self, msg: Msg) -> None:
+        super()._drop(msg)
+        self._release((msg.subject, msg.data))
+
+    async def _run_request(self, msg: Msg, received_time: float) -> None:
+        try:
+            await super()._run_request(msg, received_time)
+        finally:
+            self._release((msg.subject, msg.data))
+
+    async def _handle_request(self, msg: Msg) -> None:
+        payload = await self._respond(msg, serialization.codec.loads(msg.data))
+        if (response := self._in_flight.get((msg.subject, msg.data))) is not None and not response.done():
+            response.set_result(payload)
+        await self._reply(msg, payload)
+
+    async def _reply_collapsed(self, msg: Msg, response: asyncio.Future[bytes]) -> None:
+        try:
+            payload = await response
+        except asyncio.CancelledError:
+            if not response.cancelled():
+                raise
+            logger.warning("Dropped Resgate request %s, the request it was collapsed into failed", msg.subject)
+            return
+        await self._reply(msg, payload)
+
+    def _release(self, key: tuple[str, bytes]) -> None:
+        """
+        Stop collapsing requests into the request for `key`, the requests
+        collapsed into it are dropped when it failed.
+        """
+        if (response := self._in_flight.pop(key, None)) is not None and not response.done():
+            response.cancel()
+
+    async def _respond(self, msg: Msg, data: dict) -> bytes:
+        """
+        Get the encoded response from the cache, or cache the response of the
+        callback when it found the resource.
+        """
+        if self.cache is None:
+            return await super()._respond(msg, data)
+
+        rid = msg.subject.removeprefix("get.")
+        query = data.get("query") or None
+        if (payload := self.cache.get(rid, query)) is not None:
+            return payload
+
+        self.cache.start(rid)
+        try:
+            response = await self._process(self._get_model(msg, data))
+            payload = self._encode(response)
+        except BaseException:
+            self.cache.cancel(rid)
+            raise
+
+        if "result" in response:
+            self.cache.set(rid, query, payload)
+        else:
+            self.cache.cancel(rid)
+        return payload
 
     async def _process(self, model: GetResGateModel) -> dict:
         """
@@ -78,6 +292,9 @@ class GetHandler(Handler[GetResGateModel]):
         if response:
             assert isinstance(response, dict), "Response from get handler should be a dict."
 
+            if self._states is not None and "model" in response and not model.data.get("query"):
+                self._states.seed(model.subject.removeprefix("get."), response["model"])
+
             return {"result": response}
         else:
             return {"error": {"code": "system.notFound", "message": "Not found"}}
@@ -90,9 +307,52 @@ class AccessHandler(Handler[AccessResGateModel]):
 
     _model = AccessResGateModel
 
-    def __init__(self, subject: str, callback: ResGateAccessCallback) -> None:
-        self._subject = f"access.{subject}"
+    def __init__(
+        self,
+        subject: str,
+        callback: ResGateAccessCallback,
+        max_tasks: int = 1,
+        timeout: float = 3.0,
+        cache_size: int = 0,
+        cache_ttl: float = 60.0,
+        cache_by_pattern: bool = False,
+    ) -> None:
+        """
+        Args:
+            subject (str): Resource pattern to subscribe to, ie. "foo.bar.*".
+            callback (ResGateAccessCallback): Returns whether the resource can
+                be read.
+            max_tasks (int): Number of requests processed concurrently.
+            timeout (float): See `Handler`.
+            cache_size (int): Number of responses to cache, 0 disables the
+                cache. See `AccessCache`.
+            cache_ttl (float): Seconds a response is cached.
+            cache_by_pattern (bool): Cache responses by `subject` instead of
+                by rid, when the callback gives the same access to all
+                resources matching it.
+        """
+        super().__init__(f"access.{subject}", max_tasks=max_tasks, timeout=timeout)
         self._callback = callback
+        self._pattern = subject if cache_by_pattern else None
+        self.cache = AccessCache(subject, cache_size, cache_ttl) if cache_size else None
+
+    async def _respond(self, msg: Msg, data: dict) -> bytes:
+        """
+        Get the encoded response from the cache, or cache the response of the
+        callback.
+        """
+        if self.cache is None:
+            return await super()._respond(msg, data)
+
+        resource = self._pattern or msg.subject.removeprefix("access.")
+        key = self.cache.get_key(data.get("cid"), data.get("token"), resource)
+        if (payload := self.cache.get(key)) is not None:
+            return payload
+
+        version = self.cache.version
+        payload = await super()._respond(msg, data)
+        self.cache.set(key, payload, version)
+        return payload
 
     async def _process(self, model: AccessResGateModel) -> dict:
         """
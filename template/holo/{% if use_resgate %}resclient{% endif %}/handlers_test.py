@@ -0,0 +1,84 @@
+import asyncio
+
+from nats.aio.msg import Msg
+
+from holo.resclient.handlers import AccessHandler, GetHandler, Handler
+from holo.resclient.metrics import REQUEST_TIMEOUTS, REQUESTS_COLLAPSED
+
+
+def request(subject: str, reply: str, data: bytes = b'{"cid": "cid"}') -> Msg:
+    return Msg(_client=None, subject=subject, reply=reply, data=data)
+
+
+async def wait_for_requests(handler: Handler) -> None:
+    while handler._tasks:
+        await asyncio.gather(*handler._tasks)
+        # Done tasks are removed from the set by a callback, which runs on the next iteration of the loop.
+        await asyncio.sleep(0)
+
+
+async def test_drop_timed_out_requests(mocker) -> None:
+    """
+    Test requests that waited for a free slot longer than the timeout are
+    dropped instead of answered.
+    """
+    release = asyncio.Event()
+
+    async def callback(model) -> bool:
+        await release.wait()
+        return True
+
+    handler = AccessHandler("test.drop.*", callback, max_tasks=1, timeout=0.05)
+    connection = mocker.AsyncMock()
+    await handler.connect(connection)
+    timeouts = REQUEST_TIMEOUTS.labels(method="access", pattern="test.drop.*")
+    timeouts_before = timeouts._value.get()
+
+    async def deliver() -> None:
+        # Like the subscription, which delivers a request once the callback of the previous one returned.
+        for i in range(3):
+            await handler._on_request(request(f"access.test.drop.{i}", f"reply-{i}"))
+
+    delivery = asyncio.create_task(deliver())
+    await asyncio.sleep(0.08)
+    release.set()
+    await delivery
+    await wait_for_requests(handler)
+
+    assert [call.args[0] for call in connection.publish.call_args_list] == ["reply-0"]
+    assert timeouts._value.get() == timeouts_before + 2
+    assert handler._active == 0
+
+
+async def test_collapse_requests_waiting_for_slot(mocker) -> None:
+    """
+    Test identical requests are collapsed while the request they're
+    collapsed into is still waiting for a free slot.
+    """
+    release = asyncio.Event()
+    models = []
+
+    async def callback(model) -> dict:
+        models.append(model.subject)
+        await release.wait()
+        return {"model": {"id": model.id}}
+
+    handler = GetHandler("test.collapse.*", callback, max_tasks=1)
+    connection = mocker.AsyncMock()
+    await handler.connect(connection)
+    collapsed = REQUESTS_COLLAPSED.labels(method="get", pattern="test.collapse.*")
+    collapsed_before = collapsed._value.get()
+
+    # The callbacks return right away, even though the only slot is busy with the first request.
+    await handler._on_request(request("get.test.collapse.a", "reply-a", b"{}"))
+    await handler._on_request(request("get.test.collapse.b", "reply-b1", b"{}"))
+    await handler._on_request(request("get.test.collapse.b", "reply-b2", b"{}"))
+    release.set()
+    await wait_for_requests(handler)
+
+    assert models == ["get.test.collapse.a", "get.test.collapse.b"]
+    assert collapsed._value.get() == collapsed_before + 1
+    payloads = {call.args[0]: call.args[1] for call in connection.publish.call_args_list}
+    assert payloads.keys() == {"reply-a", "reply-b1", "reply-b2"}
+    assert payloads["reply-b1"] == payloads["reply-b2"]
+    assert not handler._in_flight
@@ -0,0 +1,58 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+
+REQUESTS_IN_PROGRESS = Gauge(
+    "resgate_requests_in_progress",
+    "Gauge of Resgate requests currently being processed by method and resource pattern",
+    ["method", "pattern"],
+)
+REQUESTS_WAITING = Gauge(
+    "resgate_requests_waiting",
+    "Gauge of Resgate requests waiting for a free slot by method and resource pattern",
+    ["method", "pattern"],
+)
+REQUEST_TIME = Histogram(
+    "resgate_request_time_seconds",
+    "Histogram of Resgate request time from receiving to responding by method and resource pattern (in seconds)",
+    ["method", "pattern"],
+)
+REQUEST_TIMEOUTS = Counter(
+    "resgate_request_timeouts_total",
+    "Total count of Resgate requests dropped because Resgate already timed out by method and resource pattern",
+    ["method", "pattern"],
+)
+CACHE_HITS = Counter(
+    "resgate_cache_hits_total",
+    "Total count of Resgate requests answered from the cache by method and resource pattern",
+    ["method", "pattern"],
+)
+CACHE_MISSES = Counter(
+    "resgate_cache_misses_total",
+    "Total count of Resgate requests not found in the cache by method and resource pattern",
+    ["method", "pattern"],
+)
+CACHE_SIZE = Gauge(
+    "resgate_cache_size",
+    "Gauge of responses in the Resgate cache by method and resource pattern",
+    ["method", "pattern"],
+    multiprocess_mode="liveall",
+)
+EVENTS_COALESCED = Counter(
+    "resgate_events_coalesced_total",
+    "Total count of Resgate events merged into or cancelled by another event before publishing by event",
+    ["event"],
+)
+CHANGE_EVENTS_SUPPRESSED = Counter(
+    "resgate_change_events_suppressed_total",
+    "Total count of Resgate change events not published because no value changed",
+)
+CHANGE_VALUES_UNCHANGED = Counter(
+    "resgate_change_values_unchanged_total",
+    "Total count of values left out of Resgate change events because they did not change",
+)
+REQUESTS_COLLAPSED = Counter(
+    "resgate_requests_collapsed_total",
+    "Total count of Resgate requests answered with the response of an identical concurrent request by method and "
+    "resource pattern",
+    ["method", "pattern"],
+)
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from typing import Any
+
+from holo import serialization
+from holo.resclient.cache import rid_matches
+from holo.resclient.metrics import CHANGE_EVENTS_SUPPRESSED, CHANGE_VALUES_UNCHANGED
+
+
+# Marks a value removed by a delete action, to tell it apart from a value
+# that's not known.
+_DELETED = object()
+
+
+class ModelStates:
+    """
+    Last known values of at most `size` models by rid, as published in
+    change events or returned by GET handlers. Used to strip unchanged
+    values from change events.
+
+    Values are only known for sure when all changes of the models are
+    published through the same `ResClient`.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._states: OrderedDict[str, dict[str, Any]] = OrderedDict()
+
+    def diff(self, rid: str, values: dict) -> dict | None:
+        """
+        Get the `values` that changed compared to the known values of `rid`
+        and remember them. Returns None when nothing changed.
+        """
+        state = self._get_state(rid)
+        changed = {}
+        for key, value in self._normalize(values).items():
+            if isinstance(value, dict) and value.get("action") == "delete":
+                value = _DELETED
+            if key in state and state[key] == value:
+                continue
+
+            state[key] = value
+            changed[key] = values[key]
+
+        CHANGE_VALUES_UNCHANGED.inc(len(values) - len(changed))
+        if not changed:
+            CHANGE_EVENTS_SUPPRESSED.inc()
+            return None
+        return changed
+
+    def seed(self, rid: str, model: dict) -> None:
+        """
+        Remember the values of a model returned by a GET handler, keeping the
+        values from change events that might be newer.
+        """
+        state = self._get_state(rid)
+        for key, value in self._normalize(model).items():
+            state.setdefault(key, value)
+
+    def delete(self, rid: str) -> None:
+        self._states.pop(rid, None)
+
+    def reset(self, patterns: list[str]) -> None:
+        """
+        Forget the values of rids matching any of `patterns`.
+        """
+        for rid in list(self._states):
+            if any(rid_matches(pattern, rid) for pattern in patterns):
+                del self._states[rid]
+
+    def _get_state(self, rid: str) -> dict[str, Any]:
+        if (state := self._states.get(rid)) is not None:
+            self._states.move_to_end(rid)
+            return state
+
+        state = self._states[rid] = {}
+        if len(self._states) > self.size:
+            self._states.popitem(last=False)
+        return state
+
+    @staticmethod
+    def _normalize(values: dict) -> dict:
+        """
+        Turn `values` into what they look like after decoding, so values of
+        different types that encode the same compare equal.
+        """
+        return serialization.codec.loads(serialization.codec.dumps(values))
@@ -0,0 +1,44 @@
+from uuid import UUID
+
+from holo.resclient.state import ModelStates
+
+
+def test_diff() -> None:
+    """
+    Test only changed values are returned and unchanged updates are suppressed.
+    """
+    states = ModelStates(size=10)
+    some_id = UUID("9b4a3b4c-3f5e-4b8e-9c1c-6f1e0b1d2a3f")
+
+    assert states.diff("foo.bar.1", {"name": "foo", "other_id": some_id}) == {"name": "foo", "other_id": some_id}
+    assert states.diff("foo.bar.1", {"name": "bar", "other_id": str(some_id)}) == {"name": "bar"}
+    assert states.diff("foo.bar.1", {"name": "bar"}) is None
+    assert states.diff("foo.bar.1", {"name": {"action": "delete"}}) == {"name": {"action": "delete"}}
+    assert states.diff("foo.bar.1", {"name": {"action": "delete"}}) is None
+
+
+def test_seed() -> None:
+    """
+    Test models from GET handlers don't overwrite values from change events.
+    """
+    states = ModelStates(size=10)
+    states.diff("foo.bar.1", {"name": "bar"})
+    states.seed("foo.bar.1", {"name": "foo", "age": 1})
+
+    assert states.diff("foo.bar.1", {"name": "bar", "age": 1}) is None
+
+
+def test_bounds_and_reset() -> None:
+    """
+    Test the least recently used models and reset models are forgotten.
+    """
+    states = ModelStates(size=2)
+    for rid in ("foo.bar.1", "foo.bar.2", "foo.baz.1"):
+        states.seed(rid, {"name": "foo"})
+
+    assert states.diff("foo.bar.1", {"name": "foo"}) == {"name": "foo"}
+
+    states.reset(["foo.baz.*"])
+
+    assert states.diff("foo.baz.1", {"name": "foo"}) == {"name": "foo"}
+    assert states.diff("foo.bar.1", {"name": "foo"}) is None
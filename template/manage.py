@@ -7,6 +7,7 @@ import pkgutil
 import sys
 
 from holo.commands.command import BaseCommand
+from holo.profiling import profile_to_files
 
 
 if __name__ == "__main__":
@@ -42,10 +43,15 @@ if __name__ == "__main__":
         """
         manage_args, command_args = [], []
         found_positional_arg = False
+        option_value = False
         for arg in sys.argv[1:]:
             if not found_positional_arg:
                 manage_args.append(arg)
-                if not arg.startswith("-"):
+                if option_value:
+                    option_value = False
+                elif arg in ("--profile-cpu", "--profile-memory"):
+                    option_value = True
+                elif not arg.startswith("-"):
                     # Found the first positional arg, the rest is for command.
                     found_positional_arg = True
             else:
@@ -55,6 +61,12 @@ if __name__ == "__main__":
     manage_args, command_args = split_args()
     parser = argparse.ArgumentParser()
     parser.add_argument("command", nargs="?", help="Run a command or omit to see all commands.")
+    parser.add_argument(
+        "--profile-cpu",
+        metavar="FILE",
+        help="Write the CPU profile of the command to FILE, as speedscope JSON for .json files.",
+    )
+    parser.add_argument("--profile-memory", metavar="FILE", help="Write the memory growth of the command to FILE.")
     options = parser.parse_args(args=manage_args)
 
     if not options.command:
@@ -87,4 +99,5 @@ if __name__ == "__main__":
             sys.exit(1)
 
         command_class = command_classes[0]
-        command_class.run_from_args(command_args)
+        with profile_to_files(options.profile_cpu, options.profile_memory):
+            command_class.run_from_args(command_args)
@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from asgi_logger.middleware import AccessLoggerMiddleware
+from fastapi import FastAPI
+from fastapi.middleware import Middleware
+from starlette_prometheus import PrometheusMiddleware
+
+from holo.ctx import ASGIContextMiddleware
+from holo.middleware import HoloASGIMiddleware
+from holo.segment.middleware import SegmentASGIMiddleware
+
+
+parser = argparse.ArgumentParser(description="Compare the fused middleware with the separate middlewares.")
+parser.add_argument("--number", type=int, default=10000, help="Number of requests to send to each app.")
+args = parser.parse_args()
+
+# Format the access log lines, but don't write them.
+logging.getLogger("access").addHandler(logging.NullHandler())
+logging.getLogger("access").setLevel(logging.INFO)
+logging.getLogger("access").propagate = False
+
+
+def separate_app() -> FastAPI:
+    app = FastAPI(
+        middleware=[
+            Middleware(
+                AccessLoggerMiddleware,
+                format='%(h)s %(l)s "%(R)s" %(s)s "%(a)s"',
+                logger=logging.getLogger("access"),
+            ),
+        ],
+    )
+    app.add_middleware(SegmentASGIMiddleware)
+    app.add_middleware(ASGIContextMiddleware)
+    app.add_middleware(PrometheusMiddleware)
+    return app
+
+
+def fused_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(HoloASGIMiddleware)
+    return app
+
+
+async def ping() -> dict:
+    return {"ping": "pong"}
+
+
+async def request(app: FastAPI) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/items/1",
+        "raw_path": b"/items/1",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"user-agent", b"benchmark"),
+            (b"x-segment-context-app-name", b"benchmark"),
+        ],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+        "state": {},
+    }
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict) -> None:
+        pass
+
+    await app(scope, receive, send)
+
+
+async def main() -> None:
+    for name, app in (("separate", separate_app()), ("fused", fused_app())):
+        app.add_api_route("/items/{item_id}", ping, methods=["GET"])
+        await request(app)
+
+        before_time = time.perf_counter()
+        for _ in range(args.number):
+            await request(app)
+        duration = time.perf_counter() - before_time
+        print(f"{name:<8} {duration / args.number * 1e6:7.2f}us per request")
+
+
+asyncio.run(main())
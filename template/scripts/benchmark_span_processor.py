@@ -0,0 +1,65 @@
+import argparse
+import os
+import time
+from collections.abc import Sequence
+
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+
+
+parser = argparse.ArgumentParser(description="Measure the spans per second through the span processors.")
+parser.add_argument("--number", type=int, default=20000, help="Number of traces to create.")
+parser.add_argument("--children", type=int, default=4, help="Number of child spans per trace.")
+parser.add_argument("--excluded", type=int, default=20, help="Number of extra excluded span name regexes.")
+args = parser.parse_args()
+
+# The processor reads the excluded names on construction.
+os.environ["TRACING_EXCLUDED_SPAN_NAMES"] = ",".join(f"GET /excluded-{i}.*" for i in range(args.excluded))
+os.environ["TRACING_EXCLUDED_NONE_PARENT_SPAN_NAMES"] = ",".join(f"job-{i}" for i in range(args.excluded))
+
+from holo.opentelemetry.processors import PeerSpanProcessor  # noqa: E402
+
+
+class NoopExporter(SpanExporter):
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        return SpanExportResult.SUCCESS
+
+
+def run(processor: BatchSpanProcessor) -> tuple[float, float]:
+    """
+    The spans per second of creating traces with a root and child spans, and
+    of only ending the spans in the processor.
+    """
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+
+    spans = []
+    before_time = time.perf_counter()
+    for _ in range(args.number):
+        with tracer.start_as_current_span("GET /resources") as root:
+            for _ in range(args.children):
+                with tracer.start_as_current_span("SELECT resources") as child:
+                    spans.append(child)
+        spans.append(root)
+    duration = time.perf_counter() - before_time
+
+    before_time = time.perf_counter()
+    for span in spans:
+        processor.on_end(span)
+    on_end_duration = time.perf_counter() - before_time
+
+    provider.shutdown()
+    return len(spans) / duration, len(spans) / on_end_duration
+
+
+processors = (
+    ("batch", BatchSpanProcessor, {}),
+    ("peer", PeerSpanProcessor, {}),
+    ("sampled", PeerSpanProcessor, {"sample_rate": 0.1, "latency_threshold": 1}),
+)
+for name, processor_class, kwargs in processors:
+    # Twice the spans are ended, keep them all queued.
+    processor = processor_class(NoopExporter(), max_queue_size=2 * args.number * (args.children + 1), **kwargs)
+    spans_per_second, on_end_per_second = run(processor)
+    print(f"{name:<8} {spans_per_second:10.0f} spans/s {on_end_per_second:10.0f} on_end/s")
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+import uvicorn
+
+from holo.workers import prepare_multiprocess_dir, worker_count
+
+
+if __name__ == "__main__":
+    workers = worker_count()
+    if workers > 1:
+        # Must be set before the workers start, so they write their metrics to it.
+        prepare_multiprocess_dir()
+
+    # Equivalent of command:
+    # > uvicorn service.server:app --host=0.0.0.0 --forwarded-allow-ips '*' --workers=N --loop=uvloop --http=httptools
+    uvicorn.run(
+        "service.server:app",
+        host="0.0.0.0",  # nosec B104
+        forwarded_allow_ips="*",
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+    )